@@ -1,15 +1,25 @@
 from utils import *
+from adjacency_cache import *
 from depth_first_walker import *
+from batched_depth_first_walker import *
 from neighborhood_graph_construction import *
 from temporal_sorter import *
+from shared_walk_store import *
 
 
 __all__ = [
     "set_random_seed",
     "read_edges",
+    "read_edge_columns",
     "read_nodes",
     "compute_connected_components",
+    "compute_connected_component_labels",
+    "build_neighbor_tuples",
+    "AdjacencyCache",
     "depth_first_walker",
+    "batched_depth_first_walker",
+    "build_edge_index",
     "neighborhood_graph_construction",
     "temporal_sorter",
+    "SharedWalkStore",
 ]
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+
+class AdjacencyCache:
+    """LRU cache of the adjacency tests made by depth_first_walker.
+
+    Walks from start nodes in the same large components keep testing the
+    same (node, neighbor) pairs, so one cache is meant to be shared by all
+    walks over a graph in a worker. Results are kept in an LRU dict of at
+    most max_size pairs. Misses first consult a neighbor-set fingerprint of
+    the node, a fingerprint_bits wide bitmask of its neighbors' hashes,
+    which rules out most non-neighbors of low-degree nodes without touching
+    the graph; max_fingerprints of them are kept, also LRU. Nodes with more
+    than fingerprint_bits // 8 neighbors get an all-ones fingerprint (-1),
+    since their bitmask would be mostly ones anyway.
+
+    Use it with a CSRGraph, whose adjacency tests are binary searches. A
+    dict of sets tests adjacency faster than the cache can look it up.
+    """
+
+    def __init__(self, graph, max_size=1000000, max_fingerprints=100000, fingerprint_bits=1024):
+        self.graph = graph
+        self.max_size = max_size
+        self.max_fingerprints = max_fingerprints
+        self.fingerprint_bits = fingerprint_bits
+        self.adjacent = OrderedDict()  # (node, other) -> bool
+        self.fingerprints = OrderedDict()  # node -> neighbor hash bitmask
+        self.hits = 0
+        self.misses = 0
+        self.fingerprint_rejects = 0
+
+    def _fingerprint(self, node):
+        fingerprint = self.fingerprints.get(node)
+        if fingerprint is not None:
+            self.fingerprints.move_to_end(node)
+            return fingerprint
+
+        neighbors = self.graph[node]
+        if len(neighbors) > self.fingerprint_bits // 8:
+            fingerprint = -1
+        else:
+            fingerprint = 0
+            for neighbor in neighbors:
+                fingerprint |= 1 << (hash(neighbor) % self.fingerprint_bits)
+        self.fingerprints[node] = fingerprint
+        if len(self.fingerprints) > self.max_fingerprints:
+            self.fingerprints.popitem(last=False)
+        return fingerprint
+
+    def is_adjacent(self, node, other):
+        """Return whether other is a neighbor of node."""
+        key = (node, other)
+        result = self.adjacent.get(key)
+        if result is not None:
+            self.hits += 1
+            self.adjacent.move_to_end(key)
+            return result
+
+        self.misses += 1
+        if not self._fingerprint(node) >> (hash(other) % self.fingerprint_bits) & 1:
+            self.fingerprint_rejects += 1
+            result = False
+        else:
+            result = other in self.graph[node]
+        self.adjacent[key] = result
+        if len(self.adjacent) > self.max_size:
+            self.adjacent.popitem(last=False)
+        return result
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "fingerprint_rejects": self.fingerprint_rejects,
+            "cached_pairs": len(self.adjacent),
+            "cached_fingerprints": len(self.fingerprints),
+        }
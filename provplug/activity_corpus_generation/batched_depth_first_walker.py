@@ -0,0 +1,175 @@
+import random
+
+import numpy as np
+
+
+def _concat_ranges(starts, counts):
+    """Concatenate the index ranges [start, start + count) into one array."""
+    offsets = np.cumsum(counts) - counts
+    return np.arange(counts.sum(), dtype=np.int64) + np.repeat(starts - offsets, counts)
+
+
+def _top_priority_mask(segments, segment_starts, priorities):
+    """Mark the entries whose priority tuple is the maximum of their segment."""
+    top = np.ones(len(segments), dtype=bool)
+    for priority in priorities:
+        masked = np.where(top, priority, -np.inf)
+        top &= masked == np.maximum.reduceat(masked, segment_starts)[segments]
+    return top
+
+
+def _sample_positions(starts, counts, max_candidates, rngs):
+    """Draw the neighbor positions to score, sampling like depth_first_walker.
+
+    Returns the number of candidates of every walk and their concatenated
+    positions in the indices array of the graph.
+    """
+    positions = []
+    for start, count, rng in zip(starts.tolist(), counts.tolist(), rngs):
+        if count > max_candidates:
+            sample = sorted(rng.sample(range(count), max_candidates))
+            positions.append(start + np.array(sample, dtype=np.int64))
+        else:
+            positions.append(np.arange(start, start + count, dtype=np.int64))
+    return np.minimum(counts, max_candidates), np.concatenate(positions)
+
+
+def _top_candidates(graph, current, parents, visited, neighbor_count, max_candidates=None, rngs=None):
+    """Compute the top-priority neighbors of several walks at once.
+
+    Scores the neighbors of every current node (or a sample of at most
+    max_candidates of them) with the priority tuple of depth_first_walker:
+    (distance to the parent, unvisited neighbor ratio, degree). Returns one
+    array of tied top candidates per walk, in neighbor order. rngs holds the
+    random generator of every walk, which samples its neighbors.
+    """
+    if rngs is None:
+        rngs = [random] * len(current)
+    counts = graph.degrees[current]
+    if max_candidates is not None and (counts > max_candidates).any():
+        counts, positions = _sample_positions(graph.indptr[current], counts, max_candidates, rngs)
+    else:
+        positions = _concat_ranges(graph.indptr[current], counts)
+    segment_starts = np.cumsum(counts) - counts
+    segments = np.repeat(np.arange(len(current)), counts)
+    candidates = graph.indices[positions]
+
+    # Priority Level 1: Distance to parent (0: the parent, 1: adjacent to it, 2: otherwise)
+    candidate_parents = parents[segments]
+    dist_priority = np.where(
+        candidates == candidate_parents,
+        0,
+        np.where(graph.has_edges(candidates, candidate_parents), 1, 2),
+    )
+
+    # Priority Level 2: Unvisited neighbor ratio, counting visited nodes among the neighbors
+    visited_rows = visited[segments]
+    valid = visited_rows >= 0
+    visited_neighbors = np.zeros(visited_rows.shape, dtype=bool)
+    visited_neighbors[valid] = graph.has_edges(
+        np.broadcast_to(candidates[:, None], visited_rows.shape)[valid], visited_rows[valid]
+    )
+    unvisited_neighbor_num = graph.degrees[candidates] - visited_neighbors.sum(axis=1)
+    degree_priority = neighbor_count[candidates]
+    unvisited_ratio = unvisited_neighbor_num / np.maximum(degree_priority, 1)
+
+    top = _top_priority_mask(
+        segments, segment_starts, (dist_priority, unvisited_ratio, degree_priority)
+    )
+    top_counts = np.bincount(segments[top], minlength=len(current))
+    return np.split(candidates[top], np.cumsum(top_counts)[:-1])
+
+
+def batched_depth_first_walker(
+    start_nodes,
+    max_length,
+    graph,
+    component_sizes,
+    neighbor_count,
+    random_prop,
+    max_candidates=None,
+    rngs=None,
+):
+    """Depth-first walker advancing many walks at once over a CSRGraph.
+
+    Follows the rules of depth_first_walker, but scores the neighbors of
+    all walks of a step in NumPy arrays instead of one neighbor at a time.
+    Every walk draws from the `random` module as depth_first_walker does,
+    so a single start node gives the same walk as depth_first_walker on the
+    same CSRGraph and seed; with several start nodes the draws of a step
+    are interleaved across the walks, unless every walk has its own
+    generator in rngs. A walk then depends only on its generator, not on
+    the walks it is batched with.
+
+    Args:
+        start_nodes: Starting nodes, one walk each
+        max_length: Maximum walk length
+        graph: CSRGraph of the edges
+        component_sizes: Array with the connected component size of every node id
+        neighbor_count: Array with the degree count of every node id, or None for graph.degrees
+        random_prop: Probability threshold for random vs priority-based selection
+        max_candidates: If set, only a uniform sample of this many neighbors of a
+            high-degree node is scored, as in depth_first_walker
+        rngs: Optional random.Random instance of every walk, used instead of
+            the random module
+    """
+    if neighbor_count is None:
+        neighbor_count = graph.degrees
+    num_walks = len(start_nodes)
+    if rngs is None:
+        rngs = [random] * num_walks
+    starts = np.array([graph.node_index.get(node, -1) for node in start_nodes], dtype=np.int64)
+
+    # Isolated nodes and nodes of single-node components only walk to themselves
+    lengths = np.ones(num_walks, dtype=np.int64)
+    in_graph = starts >= 0
+    in_graph[in_graph] = graph.degrees[starts[in_graph]] > 0
+    lengths[in_graph] = np.minimum(max_length, component_sizes[starts[in_graph]])
+
+    sequences = np.full((num_walks, max(max_length, 1)), -1, dtype=np.int64)
+    sequences[:, 0] = starts
+    visited = sequences.copy()  # distinct visited nodes of every walk, padded with -1
+    visited_count = np.ones(num_walks, dtype=np.int64)
+
+    for walk_len in range(1, max_length):
+        active = np.flatnonzero(lengths > walk_len)
+        if not len(active):
+            break
+        current = sequences[active, walk_len - 1]
+
+        # Priority-based selection: prefer neighbors that form triangles with parent node
+        prioritized = np.zeros(len(active), dtype=bool)
+        if walk_len >= 2:
+            prioritized[:] = [rngs[walk].random() >= random_prop for walk in active.tolist()]
+        top_candidates = iter(())
+        if prioritized.any():
+            walks = active[prioritized]
+            top_candidates = iter(
+                _top_candidates(
+                    graph,
+                    current[prioritized],
+                    sequences[walks, walk_len - 2],
+                    visited[walks],
+                    neighbor_count,
+                    max_candidates,
+                    [rngs[walk] for walk in walks.tolist()],
+                )
+            )
+
+        for position, walk in enumerate(active):
+            if prioritized[position]:
+                next_node = rngs[walk].choice(next(top_candidates))
+            else:
+                next_node = rngs[walk].choice(graph.neighbor_indices(current[position]))
+            sequences[walk, walk_len] = next_node
+            if next_node not in visited[walk, : visited_count[walk]]:
+                visited[walk, visited_count[walk]] = next_node
+                visited_count[walk] += 1
+
+    node_ids = graph.node_ids
+    return [
+        [node_ids[node] for node in sequences[walk, : lengths[walk]].tolist()]
+        if starts[walk] >= 0
+        else [start_nodes[walk]]
+        for walk in range(num_walks)
+    ]
@@ -1,8 +1,29 @@
 import random
 
 
+def _neighbor_sequence(graph, node, neighbor_tuples):
+    """Return the neighbors of node as a sequence to draw from by position."""
+    neighbors = graph[node]
+    if not isinstance(neighbors, (set, frozenset, dict)):
+        # Already indexable, like the CSR slice of a CSRGraph node
+        return neighbors
+    if neighbor_tuples is not None:
+        hub_neighbors = neighbor_tuples.get(node)
+        if hub_neighbors is not None:
+            return hub_neighbors
+    return tuple(neighbors)
+
+
 def depth_first_walker(
-    start_node, max_length, graph, component_sizes, neighbor_count, random_prop
+    start_node,
+    max_length,
+    graph,
+    component_sizes,
+    neighbor_count,
+    random_prop,
+    max_candidates=None,
+    adjacency_cache=None,
+    neighbor_tuples=None,
 ):
     """Depth-first walker with prioritized neighbor selection.
     
@@ -13,6 +34,11 @@ def depth_first_walker(
         component_sizes: Size of connected component for each node
         neighbor_count: Degree count for each node
         random_prop: Probability threshold for random vs priority-based selection
+        max_candidates: If set, only a uniform sample of this many neighbors of a
+            high-degree node is scored, so steps from hubs take bounded time
+        adjacency_cache: Optional AdjacencyCache over graph, shared across walks
+        neighbor_tuples: Optional build_neighbor_tuples(graph), so random
+            neighbors of hubs are drawn without copying their neighbor sets
     """
     # Handle isolated nodes
     if start_node not in graph:
@@ -39,12 +65,23 @@ def depth_first_walker(
             top_priority = None
             top_candidates = []
 
+            # Score a uniform sample of the neighbors of high-degree nodes
+            candidates = neighbors
+            if max_candidates is not None and len(neighbors) > max_candidates:
+                neighbor_list = _neighbor_sequence(graph, current_node, neighbor_tuples)
+                sample = sorted(random.sample(range(len(neighbor_list)), max_candidates))
+                candidates = [neighbor_list[i] for i in sample]
+
             # Iterate through neighbors and calculate multi-level priorities
-            for neighbor in neighbors:
+            for neighbor in candidates:
                 # Priority Level 1: Distance to parent (prefer triangles and 2-hops)
                 if neighbor == parent_node:
                     dist_priority = 0
-                elif parent_node in graph[neighbor]:
+                elif (
+                    adjacency_cache.is_adjacent(neighbor, parent_node)
+                    if adjacency_cache is not None
+                    else parent_node in graph[neighbor]
+                ):
                     dist_priority = 1
                 else:
                     dist_priority = 2
@@ -52,9 +89,13 @@ def depth_first_walker(
                 # Priority Level 2: Unvisited neighbor ratio (prefer nodes with more exploration potential)
                 neighbor_degree = neighbor_count.get(neighbor, 1)
                 max_degree = max(neighbor_degree, 1)
-                unvisited_neighbor_num = sum(
-                    1 for n in graph[neighbor] if n not in visited
-                )
+                # Count the visited neighbors instead, as the walk is short but hubs are large
+                neighbor_neighbors = graph[neighbor]
+                if adjacency_cache is not None:
+                    visited_neighbor_num = sum(1 for n in visited if adjacency_cache.is_adjacent(neighbor, n))
+                else:
+                    visited_neighbor_num = sum(1 for n in visited if n in neighbor_neighbors)
+                unvisited_neighbor_num = len(neighbor_neighbors) - visited_neighbor_num
                 neighbor_unvisited_ratio = unvisited_neighbor_num / max_degree
 
                 # Priority Level 3: Node degree (prefer high-degree hubs)
@@ -82,10 +123,10 @@ def depth_first_walker(
             if top_candidates:
                 next_node = random.choice(top_candidates)
             else:
-                next_node = random.choice(list(neighbors))
+                next_node = random.choice(_neighbor_sequence(graph, current_node, neighbor_tuples))
         # Random selection: low random probability
         else:
-            next_node = random.choice(list(neighbors))
+            next_node = random.choice(_neighbor_sequence(graph, current_node, neighbor_tuples))
 
         walk_sequence.append(next_node)
         visited.add(next_node)
@@ -1,13 +1,46 @@
-def neighborhood_graph_construction(sequence, edges):
+from array import array
+
+
+def build_edge_index(edges):
+    """
+    Index edges by subject node for neighborhood_graph_construction.
+    Maps every subject to the positions of its edges in `edges`, in order.
+    An edge lies within a node set exactly when its subject does and its
+    object does, so indexing by subject alone is enough.
+    """
+    edge_index = {}
+    for position, edge in enumerate(edges):
+        postings = edge_index.get(edge["subject"])
+        if postings is None:
+            postings = edge_index[edge["subject"]] = array("q")
+        postings.append(position)
+    return edge_index
+
+
+def neighborhood_graph_construction(sequence, edges, edge_index=None):
     """
     Filter edges from sequence nodes and sort by line number.
     This will construct a neighborhood graph for the given sequence of nodes,
     encompassing all edges related to those nodes.
+    With an edge_index from build_edge_index, only the edges of the sequence
+    nodes are visited instead of all edges.
     """
     nodes_in_sequence = set(sequence)
-    relevant = [
-        edge
-        for edge in edges
-        if edge["subject"] in nodes_in_sequence and edge["object"] in nodes_in_sequence
+    if edge_index is None:
+        relevant = [
+            edge
+            for edge in edges
+            if edge["subject"] in nodes_in_sequence and edge["object"] in nodes_in_sequence
+        ]
+        return relevant
+
+    positions = [
+        position
+        for node in nodes_in_sequence
+        for position in edge_index.get(node, ())
+        if edges[position]["object"] in nodes_in_sequence
     ]
+    # Keep the order of the full scan
+    positions.sort()
+    relevant = [edges[position] for position in positions]
     return relevant
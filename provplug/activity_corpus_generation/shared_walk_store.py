@@ -0,0 +1,185 @@
+from array import array
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from parser import CSRGraph
+from utils import compute_connected_component_labels
+from batched_depth_first_walker import batched_depth_first_walker, _concat_ranges
+
+
+def _encode_strings(strings):
+    """Pack strings into one UTF-8 byte array plus an offsets array."""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(data, offsets):
+    raw = data.tobytes()
+    return [
+        raw[start:end].decode("utf-8")
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
+
+
+class SharedWalkStore:
+    """Walk inputs of multi_round_workflow as flat arrays in shared memory.
+
+    Holds the undirected CSR graph with its edge keys, the component size
+    of every node and the edges (line number, subject, event and object
+    columns plus a subject -> edge posting index) as NumPy arrays. create()
+    builds them once from the edges and copies them into
+    multiprocessing.shared_memory blocks; worker processes attach() to the
+    blocks by name through the picklable spec, so no task has to carry the
+    graph. The creating process
+    must unlink() the blocks when done, which the context manager does.
+    """
+
+    def __init__(self, arrays, blocks=(), owner=False):
+        self.arrays = arrays
+        self.blocks = blocks
+        self.owner = owner
+        self.node_ids = _decode_strings(arrays["node_data"], arrays["node_offsets"])
+        self.events = _decode_strings(arrays["event_data"], arrays["event_offsets"])
+        self.graph = CSRGraph(
+            self.node_ids, arrays["indptr"], arrays["indices"], edge_keys=arrays["edge_keys"]
+        )
+        self.component_sizes = arrays["component_sizes"]
+
+    @staticmethod
+    def build_arrays(edges):
+        """Build the store arrays from edges as returned by read_edges."""
+        node_index = {}
+        event_codes = {}
+        lines = array("q")
+        subjects = array("q")
+        objects = array("q")
+        events = array("q")
+        for edge in edges:
+            lines.append(edge["line"])
+            subjects.append(node_index.setdefault(edge["subject"], len(node_index)))
+            objects.append(node_index.setdefault(edge["object"], len(node_index)))
+            events.append(event_codes.setdefault(edge["event"], len(event_codes)))
+        subjects = np.frombuffer(subjects, dtype=np.int64)
+        objects = np.frombuffer(objects, dtype=np.int64)
+        num_nodes = len(node_index)
+
+        graph = CSRGraph.from_edge_arrays(subjects, objects, list(node_index))
+        labels, sizes = compute_connected_component_labels(subjects, objects, num_nodes)
+        edge_index_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(subjects, minlength=num_nodes), out=edge_index_indptr[1:])
+
+        node_data, node_offsets = _encode_strings(node_index)
+        event_data, event_offsets = _encode_strings(event_codes)
+        return {
+            "node_data": node_data,
+            "node_offsets": node_offsets,
+            "event_data": event_data,
+            "event_offsets": event_offsets,
+            "indptr": graph.indptr,
+            "indices": graph.indices,
+            "edge_keys": graph.edge_keys,
+            "component_sizes": sizes[labels],
+            "edge_line": np.frombuffer(lines, dtype=np.int64),
+            "edge_subject": subjects,
+            "edge_object": objects,
+            "edge_event": np.frombuffer(events, dtype=np.int64).astype(np.int32),
+            "edge_index_indptr": edge_index_indptr,
+            "edge_index": np.argsort(subjects, kind="stable"),
+        }
+
+    @classmethod
+    def create(cls, edges):
+        """Build the store from edges and copy it into new shared memory blocks."""
+        arrays = {}
+        blocks = []
+        for name, values in cls.build_arrays(edges).items():
+            # Zero-sized blocks are not allowed
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            blocks.append(block)
+            arrays[name] = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+            arrays[name][:] = values
+        return cls(arrays, blocks, owner=True)
+
+    @property
+    def spec(self):
+        """Picklable description of the blocks for attach()."""
+        return {
+            name: (block.name, values.dtype.str, values.shape)
+            for (name, values), block in zip(self.arrays.items(), self.blocks)
+        }
+
+    @classmethod
+    def attach(cls, spec):
+        """Attach to the shared memory blocks of a store created in another process."""
+        arrays = {}
+        blocks = []
+        for name, (block_name, dtype, shape) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return cls(arrays, blocks)
+
+    def walk(self, start_node, max_length, random_prop, max_candidates=None):
+        """Depth-first walk from start_node, as depth_first_walker on the CSR graph."""
+        return self.walks([start_node], max_length, random_prop, max_candidates)[0]
+
+    def walks(self, start_nodes, max_length, random_prop, max_candidates=None, rngs=None):
+        """Depth-first walks from all start_nodes, advanced together by batched_depth_first_walker."""
+        return batched_depth_first_walker(
+            start_nodes,
+            max_length,
+            self.graph,
+            self.component_sizes,
+            None,
+            random_prop,
+            max_candidates,
+            rngs,
+        )
+
+    def neighborhood(self, sequence):
+        """Edges between the nodes of sequence, as neighborhood_graph_construction."""
+        node_index = self.graph.node_index
+        nodes = np.array(
+            sorted({node_index[node] for node in sequence if node in node_index}), dtype=np.int64
+        )
+        indptr = self.arrays["edge_index_indptr"]
+        postings = _concat_ranges(indptr[nodes], indptr[nodes + 1] - indptr[nodes])
+        positions = self.arrays["edge_index"][postings]
+        positions = np.sort(positions[np.isin(self.arrays["edge_object"][positions], nodes)])
+
+        lines = self.arrays["edge_line"][positions].tolist()
+        subjects = self.arrays["edge_subject"][positions].tolist()
+        events = self.arrays["edge_event"][positions].tolist()
+        objects = self.arrays["edge_object"][positions].tolist()
+        return [
+            {
+                "line": line,
+                "subject": self.node_ids[subject],
+                "event": self.events[event],
+                "object": self.node_ids[obj],
+            }
+            for line, subject, event, obj in zip(lines, subjects, events, objects)
+        ]
+
+    def close(self):
+        # Drop the views before closing, as the blocks cannot close while exported
+        self.arrays = {}
+        self.graph = None
+        self.component_sizes = None
+        for block in self.blocks:
+            block.close()
+
+    def unlink(self):
+        for block in self.blocks:
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self.owner:
+            self.unlink()
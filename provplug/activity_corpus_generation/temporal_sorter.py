@@ -3,9 +3,9 @@ def temporal_sorter(neighborhood_graph):
     Sort the neighborhood graph.
     Align the events within the neighborhood graph with natural language sequences.
     """
-    sorted = sorted(neighborhood_graph, key=lambda x: x["line"])
+    sorted_edges = sorted(neighborhood_graph, key=lambda x: x["line"])
     natural_language_sentences = []
-    for edge in sorted:
+    for edge in sorted_edges:
         subject = edge["subject"]
         event = edge["event"]
         object = edge["object"]
@@ -1,6 +1,13 @@
+import os
 import json
+import heapq
 from collections import deque
+from operator import itemgetter
 import random
+import numpy as np
+
+
+TIME_INDEX_SUFFIX = ".tsidx"
 
 
 def set_random_seed(seed=42):
@@ -8,29 +15,155 @@ def set_random_seed(seed=42):
     random.seed(seed)
 
 
-def read_edges(filename):
-    """Parse edges from the unified JSONL file."""
+def read_edge_columns(dirname, mmap=True):
+    """Load a columnar edge directory written with the parsers' 'npy' output format.
+
+    Returns a dict with the "subject", "object", "event" and, if present,
+    "timestamp" arrays (memory-mapped unless mmap is False), plus the
+    "nodes" and "events" vocabularies the integer columns index into.
+    """
+    mmap_mode = "r" if mmap else None
+    columns = {}
+    for name in ("subject", "object", "event", "timestamp"):
+        path = os.path.join(dirname, f"{name}.npy")
+        columns[name] = np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+    with open(os.path.join(dirname, "nodes.json"), "r", encoding="utf-8") as f:
+        columns["nodes"] = json.load(f)
+    with open(os.path.join(dirname, "events.json"), "r", encoding="utf-8") as f:
+        columns["events"] = json.load(f)
+    return columns
+
+
+def _read_edges_from_columns(dirname, start_time=None, end_time=None):
+    columns = read_edge_columns(dirname)
+    nodes, events = columns["nodes"], columns["events"]
+    timestamps = columns["timestamp"]
+
+    start, end = 0, len(columns["subject"])
+    if start_time is not None or end_time is not None:
+        if timestamps is None:
+            raise ValueError(f"{dirname} has no timestamp column to select a time window")
+        if start_time is not None:
+            start = int(np.searchsorted(timestamps, start_time, side="left"))
+        if end_time is not None:
+            end = int(np.searchsorted(timestamps, end_time, side="left"))
+
     edges = []
-    with open(filename, "r", encoding="utf-8") as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-                edges.append(
-                    {
-                        "line": line_num,  # choronlogical line number sorted by timestamp
-                        "subject": data["subject"],
-                        "event": data["event"],
-                        "object": data["object"],
-                    }
-                )
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Line {line_num}: skipped ({e.__class__.__name__})")
+    for offset, (subject, event, obj) in enumerate(
+        zip(
+            columns["subject"][start:end].tolist(),
+            columns["event"][start:end].tolist(),
+            columns["object"][start:end].tolist(),
+        )
+    ):
+        edge = {
+            "line": start + offset + 1,
+            "subject": nodes[subject],
+            "event": events[event],
+            "object": nodes[obj],
+        }
+        if timestamps is not None:
+            edge["timestamp"] = int(timestamps[start + offset])
+        edges.append(edge)
     return edges
 
 
+def _time_index_runs(filename):
+    """Read the `<filename>.tsidx` index written with --keep-timestamp into sorted runs.
+
+    Every run is a list of (timestamp, byte offset, line number) entries.
+    The output is sorted by timestamp only within a run: each checkpointed
+    parse appends a new one, whose first entry carries a fourth "run" field.
+    Without an index, the whole file is one run read from its start.
+    """
+    runs = [[(None, 0, 1)]]
+    index_path = filename + TIME_INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return runs
+    with open(index_path, "r", encoding="utf-8") as f:
+        for entry in f:
+            fields = entry.rstrip("\n").split("\t")
+            timestamp, offset, line_num = map(int, fields[:3])
+            if len(fields) > 3:
+                runs.append([])
+            runs[-1].append((timestamp, offset, line_num))
+    return runs
+
+
+def _time_index_seek(run, start_time):
+    """Find the byte offset and line number to start reading a time window of a run from."""
+    _, offset, line_num = run[0]
+    if start_time is None:
+        return offset, line_num
+    for timestamp, entry_offset, entry_line in run[1:]:
+        if timestamp >= start_time:
+            break
+        offset, line_num = entry_offset, entry_line
+    return offset, line_num
+
+
+def _iter_jsonl_edges(f, filename, offset, first_line_num, end_line_num=None, start_time=None, end_time=None):
+    """Yield the edges of f from offset up to line end_line_num (exclusive), within the time window."""
+    time_window = start_time is not None or end_time is not None
+    f.seek(offset)
+    for line_num, line in enumerate(f, first_line_num):
+        if end_line_num is not None and line_num >= end_line_num:
+            return
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            edge = {
+                "line": line_num,  # choronlogical line number sorted by timestamp
+                "subject": data["subject"],
+                "event": data["event"],
+                "object": data["object"],
+            }
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Line {line_num}: skipped ({e.__class__.__name__})")
+            continue
+
+        timestamp = data.get("timestamp")
+        if timestamp is not None:
+            edge["timestamp"] = timestamp
+        if time_window:
+            if timestamp is None:
+                raise ValueError(f"{filename} has no timestamps to select a time window")
+            if start_time is not None and timestamp < start_time:
+                continue
+            if end_time is not None and timestamp >= end_time:
+                return
+        yield edge
+
+
+def read_edges(filename, start_time=None, end_time=None):
+    """Parse edges from the unified JSONL file or a columnar edge directory.
+
+    start_time and end_time select the edges with start_time <= timestamp < end_time
+    from timestamp-sorted output written with --keep-timestamp. Outputs
+    appended to by checkpointed parses hold several sorted runs; each is
+    searched on its own and the window is returned sorted by timestamp.
+    """
+    if os.path.isdir(filename):
+        return _read_edges_from_columns(filename, start_time, end_time)
+
+    with open(filename, "r", encoding="utf-8") as f:
+        if start_time is None and end_time is None:
+            return list(_iter_jsonl_edges(f, filename, 0, 1))
+
+        runs = _time_index_runs(filename)
+        windows = []
+        for position, run in enumerate(runs):
+            offset, first_line_num = _time_index_seek(run, start_time)
+            end_line_num = runs[position + 1][0][2] if position + 1 < len(runs) else None
+            windows.append(list(_iter_jsonl_edges(f, filename, offset, first_line_num, end_line_num,
+                                                  start_time, end_time)))
+    if len(windows) == 1:
+        return windows[0]
+    return list(heapq.merge(*windows, key=itemgetter("timestamp")))
+
+
 def read_nodes(filename):
     """Read nodes from a text file."""
     nodes = []
@@ -70,3 +203,73 @@ def compute_connected_components(graph):
 
     print(f"Found {len(components)} connected components")
     return component_sizes
+
+
+def build_neighbor_tuples(graph, min_degree=256):
+    """Map the nodes with at least min_degree neighbors to a tuple of them.
+
+    depth_first_walker picks random neighbors by position, which a set
+    cannot index; with these tuples it does not copy the neighbors of a
+    hub at every step. The tuples keep the iteration order of the graph.
+    """
+    return {
+        node: tuple(neighbors)
+        for node, neighbors in graph.items()
+        if len(neighbors) >= min_degree
+    }
+
+
+def _union_find_labels(subjects, objects, num_nodes):
+    """Label nodes with the smallest node id of their component.
+
+    Vectorized union-find: every round hooks the root of each edge endpoint
+    onto the smaller of the two roots, then compresses paths by pointer
+    jumping until every node points at its root.
+    """
+    labels = np.arange(num_nodes, dtype=np.int64)
+    while True:
+        subject_roots = labels[subjects]
+        object_roots = labels[objects]
+        if np.array_equal(subject_roots, object_roots):
+            return labels
+        smaller_roots = np.minimum(subject_roots, object_roots)
+        np.minimum.at(labels, subject_roots, smaller_roots)
+        np.minimum.at(labels, object_roots, smaller_roots)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def compute_connected_component_labels(subjects, objects, num_nodes):
+    """Compute connected components of an integer edge list.
+
+    subjects and objects are arrays of node ids in [0, num_nodes), such as
+    the columns of `read_edge_columns`; edge direction is ignored. Returns
+    a label array with the component of every node, numbered by the
+    smallest node id in the component, and a size array indexed by label,
+    so the size of node i's component is sizes[labels[i]]. Uses scipy's
+    sparse graph routines when scipy is installed and a vectorized
+    union-find otherwise.
+    """
+    subjects = np.asarray(subjects, dtype=np.int64)
+    objects = np.asarray(objects, dtype=np.int64)
+    try:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        _, labels = np.unique(
+            _union_find_labels(subjects, objects, num_nodes), return_inverse=True
+        )
+    else:
+        adjacency = coo_matrix(
+            (np.ones(len(subjects), dtype=np.int8), (subjects, objects)),
+            shape=(num_nodes, num_nodes),
+        )
+        _, labels = connected_components(adjacency, directed=False)
+
+    labels = labels.astype(np.int64, copy=False)
+    sizes = np.bincount(labels, minlength=1 if num_nodes else 0)
+    print(f"Found {len(sizes)} connected components")
+    return labels, sizes
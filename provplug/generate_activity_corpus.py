@@ -11,6 +11,10 @@ def generate_activity_corpus(
     neighbor_count,
     max_sequence_length,
     random_prop,
+    edge_index=None,
+    max_candidates=None,
+    adjacency_cache=None,
+    neighbor_tuples=None,
 ):
     # Perform a depth-first walk
     walk_sequence = depth_first_walker(
@@ -20,10 +24,13 @@ def generate_activity_corpus(
         component_sizes,
         neighbor_count,
         random_prop,
+        max_candidates,
+        adjacency_cache,
+        neighbor_tuples,
     )
 
     # Construct neighborhood graph
-    context = neighborhood_graph_construction(walk_sequence, edges)
+    context = neighborhood_graph_construction(walk_sequence, edges, edge_index)
 
     # Temporal sorting and natural language alignment
     natural_language_text = temporal_sorter(context)
@@ -31,6 +38,41 @@ def generate_activity_corpus(
     return natural_language_text
 
 
+def generate_activity_corpus_from_store(
+    start_node,
+    store,
+    max_sequence_length,
+    random_prop,
+    max_candidates=None,
+):
+    """Generate the activity corpus of start_node from a SharedWalkStore."""
+    return generate_activity_corpora_from_store(
+        [start_node], store, max_sequence_length, random_prop, max_candidates
+    )[0]
+
+
+def generate_activity_corpora_from_store(
+    start_nodes,
+    store,
+    max_sequence_length,
+    random_prop,
+    max_candidates=None,
+    rngs=None,
+):
+    """Generate the activity corpora of start_nodes from a SharedWalkStore.
+
+    The walks of all start nodes are taken together as one batch; with
+    rngs, one random.Random per start node, each walk only draws from its
+    own generator.
+    """
+    walk_sequences = store.walks(start_nodes, max_sequence_length, random_prop, max_candidates, rngs)
+    natural_language_texts = []
+    for walk_sequence in walk_sequences:
+        context = store.neighborhood(walk_sequence)
+        natural_language_texts.append(temporal_sorter(context))
+    return natural_language_texts
+
+
 if __name__ == "__main__":
     # Example hyperparameters
     random_seed = 42
@@ -46,7 +88,7 @@ if __name__ == "__main__":
 
     # Read edges and build the graph
     edges = read_edges(input_jsonl_path)
-    graph = build_undirected_graph(edges)
+    graph = build_undirected_graph(edges, ordered=True)
 
     # Prepare for depth-first walks
     component_sizes = compute_connected_components(graph)
@@ -1,56 +1,232 @@
 from .multi_round_workflow import multi_round_workflow
 from activity_corpus_generation import *
 from parser import build_undirected_graph
+from .json_extraction import JsonExtractor
+from .response_cache import ResponseCache
 import random
-import re
-import json
+import pickle
+from array import array
+import numpy as np
+
+
+def _is_edge(edge):
+    return (
+        isinstance(edge, dict)
+        and "entity1" in edge
+        and ("entity2" in edge or "entitiy2" in edge)
+        and "confidence_level" in edge
+    )
+
+
+def _is_edge_list(value):
+    """Return whether value is a non-empty list of Plugin1 edge objects."""
+    return isinstance(value, list) and len(value) > 0 and all(_is_edge(edge) for edge in value)
+
+
+# Shared by all calls, so its counters cover every response of the run
+json_extractor = JsonExtractor(_is_edge_list)
 
 
 def _extract_json_objects(content):
     """
-    Extract JSON objects from the file content
+    Extract the JSON array of edges from the response content
     """
-    # Find the JSON part (usually after the blank line)
-    lines = content.split("\n")
-    json_start = -1
+    return json_extractor.extract(content, default=[])
 
-    for i, line in enumerate(lines):
-        if line.strip() == "":
-            json_start = i + 1
-            break
 
-    if json_start == -1:
-        return []
+def _edge_entities(edge):
+    # The Plugin1 prompt spells the second key "entitiy2", so accept both
+    entity2 = edge.get("entity2", edge.get("entitiy2"))
+    return edge.get("entity1"), entity2
 
-    json_content = "\n".join(lines[json_start:])
 
-    # Use regular expressions to match JSON arrays
-    json_match = re.search(r"\[.*\]", json_content, re.DOTALL)
-    if not json_match:
-        return []
+class EdgeAccumulator:
+    """Plugin1 edge suggestions merged across walks and rounds.
 
-    try:
-        json_str = json_match.group(0)
-        # Clean up comments and trailing commas in the JSON string
-        json_str = re.sub(r"//.*", "", json_str)  # Remove single-line comments
-        json_str = re.sub(r",\s*}", "}", json_str)  # Fix trailing commas (object level)
-        json_str = re.sub(r",\s*]", "]", json_str)  # Fix trailing commas (array level)
+    Entities are interned to integer ids, and every suggestion is buffered
+    in compact arrays and merged, once buffer_size suggestions have
+    accumulated, into one row per (entity1, entity2) edge with the number
+    of suggestions, the sum and max of their confidence levels and a
+    histogram of them over histogram_bins (the prompt asks for levels in
+    [0, 5]). Edges keep the direction the LLM gave them.
+    """
 
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-        return []
+    STATISTICS = ("count", "mean", "max")
 
+    def __init__(self, histogram_bins=(0, 1, 2, 3, 4, 5), buffer_size=1000000):
+        self.histogram_bins = np.asarray(histogram_bins, dtype=np.float64)
+        self.buffer_size = buffer_size
+        self.node_ids = {}
+        self.node_names = []
+        self.skipped = 0  # suggestions without both entities or a numeric confidence
+        self.sources = np.empty(0, dtype=np.int64)
+        self.targets = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.totals = np.empty(0, dtype=np.float64)
+        self.maxima = np.empty(0, dtype=np.float64)
+        self.histograms = np.empty((0, len(self.histogram_bins) - 1), dtype=np.int64)
+        self._clear_pending()
 
-def extract_adding_edges(query_results, confidence_threshold=0):
-    adding_edges = set()
-    for result in query_results:
-        json_object = _extract_json_objects(result)
-        for edge in json_object:
-            if edge['confidence_level'] < confidence_threshold:
+    def _clear_pending(self):
+        self.pending_sources = array("q")
+        self.pending_targets = array("q")
+        self.pending_confidences = array("d")
+
+    def _node_id(self, node):
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.node_names)
+            self.node_ids[node] = node_id
+            self.node_names.append(node)
+        return node_id
+
+    def add(self, entity1, entity2, confidence):
+        self.pending_sources.append(self._node_id(entity1))
+        self.pending_targets.append(self._node_id(entity2))
+        self.pending_confidences.append(confidence)
+        if len(self.pending_confidences) >= self.buffer_size:
+            self.compact()
+
+    def add_edges(self, edges):
+        """Add the edge dicts of one parsed Plugin1 response."""
+        for edge in edges:
+            if not isinstance(edge, dict):
+                self.skipped += 1
                 continue
-            adding_edges.add((edge['entity1'], edge['entity2']))
-    return adding_edges
+            entity1, entity2 = _edge_entities(edge)
+            try:
+                confidence = float(edge["confidence_level"])
+            except (KeyError, TypeError, ValueError):
+                confidence = None
+            if not isinstance(entity1, str) or not isinstance(entity2, str) or confidence is None:
+                self.skipped += 1
+                continue
+            self.add(entity1, entity2, confidence)
+
+    def add_results(self, query_results):
+        for result in query_results:
+            self.add_edges(_extract_json_objects(result))
+
+    def compact(self):
+        """Merge buffered suggestions into the per-edge rows."""
+        if not self.pending_confidences:
+            return
+        confidences = np.frombuffer(self.pending_confidences, dtype=np.float64)
+        bins = np.clip(
+            np.searchsorted(self.histogram_bins, confidences, side="right") - 1,
+            0, len(self.histogram_bins) - 2,
+        )
+        histograms = np.zeros((len(confidences), len(self.histogram_bins) - 1), dtype=np.int64)
+        histograms[np.arange(len(confidences)), bins] = 1
+
+        sources = np.concatenate([self.sources, np.frombuffer(self.pending_sources, dtype=np.int64)])
+        targets = np.concatenate([self.targets, np.frombuffer(self.pending_targets, dtype=np.int64)])
+        counts = np.concatenate([self.counts, np.ones(len(confidences), dtype=np.int64)])
+        totals = np.concatenate([self.totals, confidences])
+        maxima = np.concatenate([self.maxima, confidences])
+        histograms = np.concatenate([self.histograms, histograms])
+
+        # Sort by edge and reduce every run of equal edges into one row
+        order = np.lexsort((targets, sources))
+        sources, targets = sources[order], targets[order]
+        starts = np.flatnonzero(
+            np.concatenate([[True], (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])])
+        )
+        self.sources, self.targets = sources[starts], targets[starts]
+        self.counts = np.add.reduceat(counts[order], starts)
+        self.totals = np.add.reduceat(totals[order], starts)
+        self.maxima = np.maximum.reduceat(maxima[order], starts)
+        self.histograms = np.add.reduceat(histograms[order], starts)
+        self._clear_pending()
+
+    def __len__(self):
+        self.compact()
+        return len(self.counts)
+
+    def statistic(self, name):
+        """Return the per-edge 'count', 'mean' or 'max' confidence as an array."""
+        if name not in self.STATISTICS:
+            raise ValueError(
+                f"Unknown statistic: {name}. Supported statistics: {', '.join(self.STATISTICS)}"
+            )
+        self.compact()
+        if name == "count":
+            return self.counts
+        if name == "mean":
+            return self.totals / np.maximum(self.counts, 1)
+        return self.maxima
+
+    def _edge(self, row):
+        return self.node_names[self.sources[row]], self.node_names[self.targets[row]]
+
+    def edges(self, rows=None):
+        """Yield (entity1, entity2, count, mean, max, histogram) for the given rows, or all."""
+        self.compact()
+        rows = range(len(self.counts)) if rows is None else rows
+        means = self.statistic("mean")
+        for row in rows:
+            yield (
+                *self._edge(row), int(self.counts[row]), float(means[row]),
+                float(self.maxima[row]), self.histograms[row].tolist(),
+            )
+
+    def threshold(self, confidence, statistic="max", min_count=1):
+        """Return the rows whose statistic is >= confidence, suggested at least min_count times."""
+        mask = self.statistic(statistic) >= confidence
+        if min_count > 1:
+            mask &= self.counts >= min_count
+        return np.flatnonzero(mask)
+
+    def top_k(self, k, statistic="mean", min_count=1):
+        """Return the rows of the k edges with the highest statistic, best first."""
+        values = self.statistic(statistic)
+        rows = np.flatnonzero(self.counts >= min_count)
+        if k < len(rows):
+            rows = rows[np.argpartition(-values[rows], k)[:k]]
+        # Ties are broken by suggestion count
+        return rows[np.lexsort((-self.counts[rows], -values[rows]))]
+
+    def adding_edges(self, rows):
+        return {self._edge(row) for row in rows}
+
+    def to_csv(self, path, rows=None):
+        """Write "entity1,entity2" lines as read by sota/Kairos/add_plugin1_edges_to_database.py.
+
+        Entities containing a comma or a line break cannot be written in this
+        layout and their edges are skipped. Returns the number of edges written.
+        """
+        self.compact()
+        rows = range(len(self.counts)) if rows is None else rows
+        written = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                entity1, entity2 = self._edge(row)
+                if any(c in entity1 or c in entity2 for c in ",\r\n"):
+                    continue
+                f.write(f"{entity1},{entity2}\n")
+                written += 1
+        if written < len(rows):
+            print(f"Skipped {len(rows) - written} edges with commas or line breaks in their entities")
+        return written
+
+    def save(self, path):
+        self.compact()
+        with open(path, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        accumulator = cls()
+        with open(path, "rb") as f:
+            accumulator.__dict__.update(pickle.load(f))
+        return accumulator
+
+
+def extract_adding_edges(query_results, confidence_threshold=0):
+    accumulator = EdgeAccumulator()
+    accumulator.add_results(query_results)
+    # An edge is added if any suggestion of it reaches the threshold
+    return accumulator.adding_edges(accumulator.threshold(confidence_threshold, statistic="max"))
 
 
 def main():
@@ -67,12 +243,15 @@ def main():
     input_start_nodes = None
     num_prop = 0.001
 
+    # Reuse the LLM responses of earlier runs, e.g. "responses.sqlite"
+    response_cache_path = None
+
     # Set the random seed for reproducibility
     set_random_seed(random_seed)
 
     # Read edges and build the graph
     edges = read_edges(input_jsonl_path)
-    graph = build_undirected_graph(edges)
+    graph = build_undirected_graph(edges, ordered=True)
 
     # Prepare for depth-first walks
     component_sizes = compute_connected_components(graph)
@@ -84,6 +263,7 @@ def main():
     else:
         start_nodes = random.choices(all_nodes, k=int(len(all_nodes) * num_prop))
 
+    response_cache = ResponseCache(response_cache_path) if response_cache_path else None
     _, responses = multi_round_workflow(
         start_nodes,
         edges,
@@ -94,9 +274,12 @@ def main():
         random_prop,
         process_count,
         plugin_name,
+        response_cache=response_cache,
+        random_seed=random_seed,
     )
     
     adding_edges = extract_adding_edges(responses, confidence_threshold=0)
+    print(f"JSON extraction: {json_extractor.stats()}")
 
     return adding_edges
 
@@ -1,51 +1,34 @@
 from .multi_round_workflow import multi_round_workflow
 from activity_corpus_generation import *
 from parser import build_undirected_graph
+from .json_extraction import JsonExtractor
+from .response_cache import ResponseCache
 import random
-import re
-import json
+import pickle
+import numpy as np
 
 
-def _extract_json_objects(content):
-    """
-    Extract JSON objects from the file content
-    """
-    # Find the JSON part (usually after the blank line)
-    lines = content.split("\n")
-    json_start = -1  # Locate where JSON data begins
+SCORE_KEYS = ("temporal_score", "contextual_score", "propagational_score")
 
-    for i, line in enumerate(lines):
-        if line.strip() == "":
-            json_start = i + 1
-            break
 
-    if json_start == -1:
-        return []
+def _is_score_object(value):
+    return isinstance(value, dict) and all(key in value for key in SCORE_KEYS)
 
-    json_content = "\n".join(lines[json_start:])
 
-    # Use regular expressions to match JSON arrays
-    json_match = re.search(r"\{.*\}", json_content, re.DOTALL)
-    if not json_match:
-        return []
+# Shared by all calls, so its counters cover every response of the run
+json_extractor = JsonExtractor(_is_score_object)
+
 
-    try:
-        json_str = json_match.group(1) if len(json_match.groups()) > 0 else json_match.group(0)
-        json_str = json_str.strip()
-
-        # Parse JSON and extract three key scoring dimensions
-        scores = json.loads(json_str)
-        temporal = scores['temporal_score']
-        contextual = scores['contextual_score']
-        propagation = scores['propagational_score']
-        # Compute average score across all three dimensions
-        avg_score = (temporal + contextual + propagation) / 3.0
-        
-        return avg_score
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
+def _extract_json_objects(content):
+    """
+    Extract the JSON scores from the response content and average them
+    """
+    scores = json_extractor.extract(content)
+    if scores is None:
         return []
-    
+    # Compute average score across all three dimensions
+    return sum(scores[key] for key in SCORE_KEYS) / 3.0
+
 
 def _batch_normalization(scores):
     """
@@ -70,14 +53,68 @@ def _batch_normalization(scores):
     return normalized_scores
 
 
-def get_training_guidance_scores(substructures, natural_language_texts, query_results):
-    """Calculate normalized training guidance scores for substructures based on LLM query results."""
+def _scores_or_zero(scores):
+    """Replace the scores that could not be extracted ([]) with 0."""
+    return [score if isinstance(score, (int, float)) else 0.0 for score in scores]
+
+
+def _text_node_scores(natural_language_texts, scores):
+    """Sum the scores of the texts every node occurs in, once per occurrence.
+
+    Each text is tokenized once into the subject and object ids of its
+    "subject,event,object." sentences. Summing the score of a text per node
+    occurrence is the product of the sparse node-by-text count matrix with
+    the score vector, which np.bincount computes from the occurrence list.
+    """
+    node_index = {}
+    occurrence_nodes = []
+    occurrence_texts = []
+    for text_index, natural_language_text in enumerate(natural_language_texts):
+        for sentence in natural_language_text.split("\n"):
+            # Node ids are UUIDs without commas, the event sits in between.
+            # Drop only the sentence's own period, as an object id may end in dots
+            if sentence.endswith("."):
+                sentence = sentence[:-1]
+            parts = sentence.split(",", 2)
+            if len(parts) != 3:
+                continue
+            for node in (parts[0], parts[2]):
+                occurrence_nodes.append(node_index.setdefault(node, len(node_index)))
+                occurrence_texts.append(text_index)
+
+    text_scores = np.array(scores, dtype=np.float64)
+    node_scores = np.bincount(
+        np.array(occurrence_nodes, dtype=np.int64),
+        weights=text_scores[np.array(occurrence_texts, dtype=np.int64)],
+        minlength=len(node_index),
+    )
+    return node_index, node_scores
+
+
+def get_training_guidance_scores(substructures, natural_language_texts, query_results, vectorized=False):
+    """Calculate normalized training guidance scores for substructures based on LLM query results.
+
+    With vectorized, node occurrences are counted by tokenizing every text
+    once instead of calling str.count per node and text, which makes the
+    cost linear in the total text and substructure sizes. Nodes then match
+    whole subject/object ids rather than substrings, and results whose
+    scores cannot be extracted count as 0.
+    """
     # Extract individual scores from LLM query results
     scores = []
     for result in query_results:
         score = _extract_json_objects(result)
         scores.append(score)
-    
+
+    if vectorized:
+        scores = _scores_or_zero(scores)
+        node_index, node_scores = _text_node_scores(natural_language_texts, scores)
+        substructure_scores = [
+            float(sum(node_scores[node_index[node]] for node in substructure if node in node_index))
+            for substructure in substructures
+        ]
+        return _batch_normalization(substructure_scores)
+
     # Aggregate scores for each substructure by counting node occurrences
     substructure_scores = [ ]
     for substructure in substructures:
@@ -94,6 +131,68 @@ def get_training_guidance_scores(substructures, natural_language_texts, query_re
     return normalized_scores
 
 
+class GuidanceScorer:
+    """Plugin2 guidance scores kept up to date across training batches.
+
+    add_results() folds the LLM scores of a round of walks into per-node
+    totals, counting node occurrences as the vectorized
+    get_training_guidance_scores does, so earlier rounds are never
+    recomputed. score() then weighs a batch of substructures in
+    O(nodes in the batch): a substructure's raw score is the sum of its
+    node totals, normalized to [0.5, 1.5] with the min/max of all raw
+    scores seen so far (lower raw scores get higher weights). The range
+    only widens, so weights of earlier batches stay comparable; call
+    reset_range() to start over, e.g. after many new results.
+    """
+
+    def __init__(self):
+        self.node_scores = {}
+        self.min_score = None
+        self.max_score = None
+
+    def add_results(self, natural_language_texts, query_results):
+        scores = _scores_or_zero([_extract_json_objects(result) for result in query_results])
+        node_index, node_scores = _text_node_scores(natural_language_texts, scores)
+        for node, index in node_index.items():
+            self.node_scores[node] = self.node_scores.get(node, 0.0) + float(node_scores[index])
+
+    def raw_score(self, substructure):
+        return sum(self.node_scores.get(node, 0.0) for node in substructure)
+
+    def score(self, substructures):
+        """Return normalized [0.5, 1.5] weights for a batch of substructures."""
+        raw_scores = [self.raw_score(substructure) for substructure in substructures]
+        if not raw_scores:
+            return []
+
+        batch_min, batch_max = min(raw_scores), max(raw_scores)
+        self.min_score = batch_min if self.min_score is None else min(self.min_score, batch_min)
+        self.max_score = batch_max if self.max_score is None else max(self.max_score, batch_max)
+
+        # Handle edge case where all scores are identical, as _batch_normalization
+        if self.min_score == self.max_score:
+            return [0.5 for _ in raw_scores]
+        return [
+            0.5 + (self.max_score - score) / (self.max_score - self.min_score)
+            for score in raw_scores
+        ]
+
+    def reset_range(self):
+        self.min_score = None
+        self.max_score = None
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        scorer = cls()
+        with open(path, "rb") as f:
+            scorer.__dict__.update(pickle.load(f))
+        return scorer
+
+
 def main():
     # Example hyperparameters
     random_seed = 42
@@ -108,12 +207,15 @@ def main():
     input_start_nodes = None
     num_prop = 0.001
 
+    # Reuse the LLM responses of earlier runs, e.g. "responses.sqlite"
+    response_cache_path = None
+
     # Set the random seed for reproducibility
     set_random_seed(random_seed)
 
     # Read edges and build the graph
     edges = read_edges(input_jsonl_path)
-    graph = build_undirected_graph(edges)
+    graph = build_undirected_graph(edges, ordered=True)
 
     # Prepare for depth-first walks
     component_sizes = compute_connected_components(graph)
@@ -125,6 +227,7 @@ def main():
     else:
         start_nodes = random.choices(all_nodes, k=int(len(all_nodes) * num_prop))
 
+    response_cache = ResponseCache(response_cache_path) if response_cache_path else None
     natural_language_texts, responses = multi_round_workflow(
         start_nodes,
         edges,
@@ -135,11 +238,14 @@ def main():
         random_prop,
         process_count,
         plugin_name,
+        response_cache=response_cache,
+        random_seed=random_seed,
     )
 
     substructures = []  # REPLACE_WITH_SUBSTRUCTURES
 
     normalized_scores = get_training_guidance_scores(substructures, natural_language_texts, responses)
+    print(f"JSON extraction: {json_extractor.stats()}")
 
     return normalized_scores
     
@@ -0,0 +1,236 @@
+import re
+import json
+import timeit
+
+
+# Strings are matched first and kept as they are, so brackets, commas and
+# // inside them are left alone; strings never span lines in LLM output
+STRING = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+COMMENT = r"//[^\n]*"
+# A // comment, or a comma followed by a closer (after whitespace and comments)
+CLEANUP_PATTERN = re.compile(rf"({STRING})|{COMMENT}|,(?=(?:\s|{COMMENT})*[\]}}])")
+BRACKET_PATTERN = re.compile(rf"{STRING}|```|[\[\]{{}}]")
+OPENER_PATTERN = re.compile(r"[\[{]")
+CLOSERS = {"[": "]", "{": "}"}
+
+_decoder = json.JSONDecoder()
+
+
+def clean_json_text(text):
+    """Remove // comments and trailing commas outside of JSON strings."""
+    # re.split keeps the captured strings and yields None for the other matches
+    return "".join(filter(None, CLEANUP_PATTERN.split(text)))
+
+
+def _matched_openers(text):
+    """Return the positions of the [ and { in text that have a matching closer.
+
+    Brackets in strings are skipped, a closer matches the nearest open
+    bracket of its kind (abandoning the ones opened after it) and a ```
+    code fence abandons every open bracket.
+    """
+    stack = []
+    matched = set()
+    for match in BRACKET_PATTERN.finditer(text):
+        token = match.group()
+        if token in CLOSERS:
+            stack.append((CLOSERS[token], match.start()))
+        elif token in ("]", "}"):
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth][0] == token:
+                    matched.add(stack[depth][1])
+                    del stack[depth:]
+                    break
+        elif token == "```":
+            stack.clear()
+    return matched
+
+
+def _whole_values(text):
+    """Yield the JSON value that is all of text, then those that are all of a ``` code fence.
+
+    This is the shape of most responses, and one json.loads of it is much
+    cheaper than trying every bracket as _iter_values does.
+    """
+    candidates = [text]
+    for fenced in text.split("```")[1::2]:
+        # Drop the language tag, as in ```json
+        tag, _, body = fenced.partition("\n")
+        candidates.append(body if tag.strip().isalnum() else fenced)
+    for candidate in candidates:
+        candidate = candidate.strip()
+        if candidate[:1] not in CLOSERS:
+            continue
+        try:
+            yield json.loads(candidate)
+        except (json.JSONDecodeError, RecursionError):
+            pass
+
+
+def _iter_values(text):
+    """Yield every top-level JSON array or object in text, in order.
+
+    Every [ or { is tried as the start of a value with raw_decode, which
+    balances brackets in C while it parses; a parsed value is skipped as a
+    whole. Once a value runs into the end of the text (cut-off output), the
+    openers without a matching closer are computed in one pass and skipped,
+    so nested unclosed brackets are not parsed to the end again and again.
+    """
+    position = 0
+    end = len(text.rstrip())
+    matched = None
+    while True:
+        match = OPENER_PATTERN.search(text, position)
+        if match is None:
+            return
+        start = match.start()
+        position = start + 1
+        if matched is not None and start not in matched:
+            continue
+        try:
+            value, position = _decoder.raw_decode(text, start)
+        except RecursionError:
+            matched = _matched_openers(text) if matched is None else matched
+            continue
+        except json.JSONDecodeError as e:
+            if e.pos >= end and matched is None:
+                matched = _matched_openers(text)
+            continue
+        yield value
+
+
+class JsonExtractor:
+    """Single-pass extractor of JSON values embedded in LLM responses.
+
+    A response that is one JSON value, or that has one as the whole of a
+    ``` code fence, is parsed directly, first as is and then cleaned of //
+    comments and trailing commas. Only if that yields no value satisfying
+    predicate is the response scanned for JSON arrays and objects with the
+    C decoder, which balances brackets as it parses, so prose around the
+    JSON and brackets inside strings do not confuse it; again as is, then
+    cleaned. The first value satisfying predicate is returned, and the
+    counters record how every response went, see stats().
+    """
+
+    def __init__(self, predicate=None):
+        self.predicate = predicate
+        self.responses = 0
+        self.extracted = 0
+        self.cleaned = 0  # extracted only after removing comments and trailing commas
+        self.no_json = 0  # no JSON value at all
+        self.rejected = 0  # responses with JSON values, none satisfying the predicate
+
+    def iter_values(self, text):
+        """Yield every top-level JSON value in text, in order."""
+        return _iter_values(text)
+
+    def _first_match(self, values):
+        found = False
+        for value in values:
+            found = True
+            if self.predicate is None or self.predicate(value):
+                return True, value
+        return found, None
+
+    def extract(self, text, default=None):
+        """Return the first JSON value in text satisfying the predicate, or default."""
+        self.responses += 1
+        found, value = self._first_match(_whole_values(text))
+        if value is None:
+            cleaned_text = clean_json_text(text)
+            attempts = [
+                (_whole_values, cleaned_text, True),
+                (_iter_values, text, False),
+                (_iter_values, cleaned_text, True),
+            ]
+            for iter_values, candidate, cleaned in attempts:
+                if cleaned and cleaned_text == text:
+                    continue
+                found_values, value = self._first_match(iter_values(candidate))
+                found = found or found_values
+                if value is not None:
+                    self.cleaned += cleaned
+                    break
+
+        if value is not None:
+            self.extracted += 1
+            return value
+        if found:
+            self.rejected += 1
+        else:
+            self.no_json += 1
+        return default
+
+    def stats(self):
+        return {
+            "responses": self.responses,
+            "extracted": self.extracted,
+            "cleaned": self.cleaned,
+            "failed": self.responses - self.extracted,
+            "no_json": self.no_json,
+            "rejected": self.rejected,
+        }
+
+
+def _regex_extract(content):
+    """The former greedy regex extraction of the interactive plugins, for benchmarking."""
+    json_match = re.search(r"\[.*\]", content, re.DOTALL)
+    if not json_match:
+        return None
+    json_str = re.sub(r"//.*", "", json_match.group(0))
+    json_str = re.sub(r",\s*}", "}", json_str)
+    json_str = re.sub(r",\s*]", "]", json_str)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        return None
+
+
+def benchmark_json_extraction(response, predicate=None, repeat=5):
+    """Time the extractor against the former greedy regex on one response.
+
+    Prints and returns the best time in seconds of each, keyed 'regex' and
+    'single_pass', and whether each found a value.
+    """
+    extractor = JsonExtractor(predicate)
+    results = {}
+    for name, extract in (("regex", _regex_extract), ("single_pass", extractor.extract)):
+        seconds = min(timeit.repeat(lambda: extract(response), number=1, repeat=repeat))
+        found = extract(response) is not None
+        print(f"{name}: {seconds * 1000:.2f} ms, {'found' if found else 'no'} value")
+        results[name] = (seconds, found)
+    return results
+
+
+if __name__ == "__main__":
+    # A ~32k-token Plugin1 style response: reasoning, then a fenced JSON array of edges
+    edge = '  {"entity1": "a1b2c3d4-0000-0000-0000-%012d", "entity2": "/tmp/f%d", "confidence_level": 0.9}, // edge\n'
+    reasoning = "Step %d: the process reads the file and writes to the socket.\n"
+    response = (
+        "".join(reasoning % i for i in range(1000))
+        + "\n```json\n[\n"
+        + "".join(edge % (i, i) for i in range(1000))
+        + "]\n```\n"
+    )
+    is_edge_list = lambda value: (
+        isinstance(value, list)
+        and len(value) > 0
+        and all(isinstance(item, dict) and "entity1" in item and "confidence_level" in item for item in value)
+    )
+    print(f"Response ({len(response)} characters)")
+    benchmark_json_extraction(response, is_edge_list)
+
+    # The same response without comments and trailing commas parses in one json.loads
+    well_formed = response.replace(", // edge\n", ",\n").replace("},\n]", "}\n]")
+    print(f"Well-formed response ({len(well_formed)} characters)")
+    benchmark_json_extraction(well_formed, is_edge_list)
+
+    # Brackets in the reasoning make the greedy regex span from prose to the array end
+    bracketed = response.replace("Step %d:" % 999, "Step [999]:")
+    print(f"Response with a bracket in the reasoning ({len(bracketed)} characters)")
+    benchmark_json_extraction(bracketed, is_edge_list)
+
+    # Output cut off with many [ and no ] after them makes the greedy regex quadratic
+    truncated = response[: len(response) // 2] + "".join(f'["{i}", ' for i in range(5000))
+    print(f"Truncated response ({len(truncated)} characters)")
+    benchmark_json_extraction(truncated, is_edge_list, repeat=1)
@@ -1,12 +1,81 @@
-from .generate_activity_corpus import generate_activity_corpus
+from .generate_activity_corpus import (
+    generate_activity_corpus,
+    generate_activity_corpus_from_store,
+    generate_activity_corpora_from_store,
+)
+from . import query_llm
 from .query_llm import query_llm_using_plugin
+from .response_cache import ResponseCache
 from activity_corpus_generation import *
+from parser import CSRGraph, build_undirected_graph
 from multiprocessing import Pool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import defaultdict, deque
+from itertools import islice
+import os
+import json
+import random
+import tempfile
+import threading
 from tqdm import tqdm
 
 
-def workflow(args):
-    (
+# Maximum number of tasks sent to a worker at once; small, since every task
+# may wait for an LLM response and results are streamed as they complete
+MAX_CHUNK_SIZE = 16
+
+# Walk inputs of one worker process, inherited by fork instead of sent per
+# task: either the graph inputs or a shared memory walk store
+_worker_graph_inputs = None
+_worker_store = None
+_worker_options = None
+
+# Adjacency cache shared by the walks of one worker process, whose
+# statistics are printed every ADJACENCY_STATS_INTERVAL walks
+ADJACENCY_STATS_INTERVAL = 10000
+_worker_adjacency_cache = None
+_worker_walk_count = 0
+
+
+def _init_worker(graph_inputs, options):
+    global _worker_graph_inputs, _worker_options, _worker_adjacency_cache, _worker_walk_count
+    _worker_graph_inputs = graph_inputs
+    _worker_options = options
+    _worker_adjacency_cache = None
+    _worker_walk_count = 0
+    graph, adjacency_cache_size = graph_inputs[1], options[5]
+    if adjacency_cache_size and isinstance(graph, CSRGraph):
+        _worker_adjacency_cache = AdjacencyCache(graph, max_size=adjacency_cache_size)
+
+
+def _init_shared_worker(spec, options):
+    global _worker_store, _worker_options
+    _worker_store = SharedWalkStore.attach(spec)
+    _worker_options = options
+
+
+def _generate_corpus(task):
+    """Generate the activity corpus of a (start_node, task_seed) task in a worker."""
+    global _worker_walk_count
+    start_node, task_seed = task
+    max_sequence_length, random_prop, _, max_candidates, _, _ = _worker_options
+
+    if task_seed is not None:
+        random.seed(task_seed)
+
+    if _worker_store is not None:
+        return generate_activity_corpus_from_store(
+            start_node,
+            _worker_store,
+            max_sequence_length,
+            random_prop,
+            max_candidates,
+        )
+
+    edges, graph, component_sizes, neighbor_count, edge_index, neighbor_tuples = _worker_graph_inputs
+    # Generate activity corpus
+    natural_language_text = generate_activity_corpus(
         start_node,
         edges,
         graph,
@@ -14,24 +83,347 @@ def workflow(args):
         neighbor_count,
         max_sequence_length,
         random_prop,
-        plugin_name,
-    ) = args
+        edge_index,
+        max_candidates,
+        _worker_adjacency_cache,
+        neighbor_tuples,
+    )
+
+    if _worker_adjacency_cache is not None:
+        _worker_walk_count += 1
+        if _worker_walk_count % ADJACENCY_STATS_INTERVAL == 0:
+            print(f"Adjacency cache of worker {os.getpid()}: {_worker_adjacency_cache.stats()}", flush=True)
+
+    return natural_language_text
+
+
+def _generate_corpora(tasks):
+    """Generate the activity corpora of a chunk of tasks in a worker.
+
+    With a shared memory store, the walks of the chunk are advanced together
+    by batched_depth_first_walker. Every walk draws from a generator seeded
+    by its own task, so it is the same walk as when generated alone.
+    """
+    if _worker_store is None:
+        return [_generate_corpus(task) for task in tasks]
+
+    max_sequence_length, random_prop, _, max_candidates, _, _ = _worker_options
+    start_nodes = [start_node for start_node, _ in tasks]
+    rngs = None
+    if tasks[0][1] is not None:
+        rngs = [random.Random(task_seed) for _, task_seed in tasks]
+    return generate_activity_corpora_from_store(
+        start_nodes,
+        _worker_store,
+        max_sequence_length,
+        random_prop,
+        max_candidates,
+        rngs,
+    )
+
+
+def workflow(task):
+    plugin_name, response_cache = _worker_options[2], _worker_options[4]
 
     # Generate activity corpus
-    natural_language_text = generate_activity_corpus(
-        start_node,
+    natural_language_text = _generate_corpus(task)
+
+    # Interact with LLM
+    response = query_llm_using_plugin(natural_language_text, plugin_name, response_cache)
+
+    return natural_language_text, response
+
+
+def _workflow_chunk(tasks):
+    """Run the workflow on a chunk of tasks, generating their corpora together."""
+    plugin_name, response_cache = _worker_options[2], _worker_options[4]
+    results = []
+    for (start_node, _), natural_language_text in zip(tasks, _generate_corpora(tasks)):
+        response = query_llm_using_plugin(natural_language_text, plugin_name, response_cache)
+        results.append((start_node, natural_language_text, response))
+    # Workers are terminated without flushing the cache, so its lookups go back with the results
+    pending = response_cache.take_pending() if response_cache is not None else None
+    return results, pending
+
+
+def _task_seeds(start_nodes, random_seed):
+    """Seed every task by its position, so walks do not depend on which worker runs them."""
+    if random_seed is None:
+        return [None] * len(start_nodes)
+    return [f"{random_seed}:{position}" for position in range(len(start_nodes))]
+
+
+def _ordered_graph(graph):
+    """Replace set neighbors by sorted dict keys, so seeded walks do not depend on PYTHONHASHSEED."""
+    if not any(isinstance(neighbors, (set, frozenset)) for neighbors in graph.values()):
+        return graph
+    print("Sorting the neighbors of the graph for seeded walks")
+    ordered = defaultdict(dict)
+    for node, neighbors in graph.items():
+        if isinstance(neighbors, (set, frozenset)):
+            neighbors = dict.fromkeys(sorted(neighbors))
+        ordered[node] = neighbors
+    return ordered
+
+
+def _chunksize(task_count, process_count):
+    return max(1, min(MAX_CHUNK_SIZE, task_count // (4 * process_count)))
+
+
+def _imap(pool, function, tasks, ordered):
+    if ordered:
+        return pool.imap(function, tasks)
+    return pool.imap_unordered(function, tasks)
+
+
+def _iter_chunks(tasks, chunksize):
+    """Split tasks into lists of up to chunksize tasks, each sent to a worker at once."""
+    tasks = iter(tasks)
+    while True:
+        chunk = list(islice(tasks, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _corpus_chunk(tasks):
+    """Generate the activity corpora of a chunk of tasks without querying the LLM."""
+    return list(zip([start_node for start_node, _ in tasks], _generate_corpora(tasks)))
+
+
+def _iter_corpora(pool, tasks, max_pending, chunksize):
+    """Yield (start_node, corpus) over tasks in order, with at most max_pending tasks queued in the pool.
+
+    Tasks are submitted chunksize at a time, so each submission is one
+    round trip to a worker rather than one per start node.
+    """
+    pending = deque()
+    max_pending_chunks = max(1, max_pending // chunksize)
+    for chunk in _iter_chunks(tasks, chunksize):
+        if len(pending) >= max_pending_chunks:
+            yield from pending.popleft().get()
+        pending.append(pool.apply_async(_corpus_chunk, (chunk,)))
+    while pending:
+        yield from pending.popleft().get()
+
+
+def _pop_response(pending, ordered):
+    """Remove the first (or with ordered, the oldest) finished request from pending."""
+    position = 0
+    if not ordered:
+        wait([future for _, _, future in pending], return_when=FIRST_COMPLETED)
+        position = next(i for i, (_, _, future) in enumerate(pending) if future.done())
+    start_node, natural_language_text, future = pending[position]
+    del pending[position]
+    return start_node, natural_language_text, future.result()
+
+
+def _iter_responses(corpora, plugin_name, max_concurrent_requests, ordered, response_cache):
+    """Query the LLM for corpora from threads, with up to max_concurrent_requests in flight."""
+    executor = ThreadPoolExecutor(max_workers=max_concurrent_requests)
+    pending = deque()
+    try:
+        for start_node, natural_language_text in corpora:
+            future = executor.submit(
+                query_llm_using_plugin, natural_language_text, plugin_name, response_cache
+            )
+            pending.append((start_node, natural_language_text, future))
+            if len(pending) >= max_concurrent_requests:
+                yield _pop_response(pending, ordered)
+        while pending:
+            yield _pop_response(pending, ordered)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _iter_pool_results(pool, tasks, process_count, plugin_name, ordered, chunksize,
+                       max_concurrent_requests, max_pending_corpora, response_cache):
+    if max_concurrent_requests is None:
+        for results, pending in _imap(pool, _workflow_chunk, _iter_chunks(tasks, chunksize), ordered):
+            if pending is not None:
+                response_cache.merge_pending(pending)
+            yield from results
+        return
+
+    # Two stages: worker processes only generate corpora, threads here query the LLM.
+    # Chunks stay small enough that every worker has one queued.
+    max_pending = max_pending_corpora or 2 * max_concurrent_requests
+    chunksize = max(1, min(chunksize, max_pending // process_count))
+    corpora = _iter_corpora(pool, tasks, max_pending, chunksize)
+    yield from _iter_responses(corpora, plugin_name, max_concurrent_requests, ordered, response_cache)
+
+
+def _iter_workflow_results(
+    start_nodes,
+    edges,
+    graph,
+    component_sizes,
+    neighbor_count,
+    max_sequence_length,
+    random_prop,
+    process_count,
+    plugin_name,
+    edge_index,
+    max_candidates,
+    adjacency_cache_size,
+    shared_memory,
+    ordered,
+    max_concurrent_requests,
+    max_pending_corpora,
+    response_cache,
+    random_seed,
+):
+    # Workers receive the walk inputs once through the pool initializer, so
+    # tasks only carry the start node and its seed
+    tasks = zip(start_nodes, _task_seeds(start_nodes, random_seed))
+    chunksize = _chunksize(len(start_nodes), process_count)
+    options = (max_sequence_length, random_prop, plugin_name, max_candidates, response_cache,
+               adjacency_cache_size)
+    if shared_memory:
+        # Build the walk inputs once in shared memory. The store rebuilds the graph from
+        # edges, so graph, component_sizes, neighbor_count and edge_index are not used,
+        # nor is the adjacency cache.
+        with SharedWalkStore.create(edges) as store:
+            with Pool(
+                processes=process_count,
+                initializer=_init_shared_worker,
+                initargs=(store.spec, options),
+            ) as pool:
+                yield from _iter_pool_results(
+                    pool,
+                    tasks,
+                    process_count,
+                    plugin_name,
+                    ordered,
+                    chunksize,
+                    max_concurrent_requests,
+                    max_pending_corpora,
+                    response_cache,
+                )
+        return
+
+    # Multiprocessing workflow execution with a large mount of start nodes.
+    # Without an edge index every corpus would scan all edges, so build it
+    # here once; workers inherit it with the other graph inputs.
+    if edge_index is None:
+        edge_index = build_edge_index(edges)
+    if adjacency_cache_size and not isinstance(graph, CSRGraph):
+        print("Not using the adjacency cache, which only speeds up walks over a CSRGraph")
+    if random_seed is not None and isinstance(graph, dict):
+        graph = _ordered_graph(graph)
+    # Hubs of dict graphs get neighbor tuples to draw from; a CSRGraph is indexed directly
+    neighbor_tuples = None if isinstance(graph, CSRGraph) else build_neighbor_tuples(graph)
+    graph_inputs = (edges, graph, component_sizes, neighbor_count, edge_index, neighbor_tuples)
+    with Pool(processes=process_count, initializer=_init_worker, initargs=(graph_inputs, options)) as pool:
+        yield from _iter_pool_results(
+            pool,
+            tasks,
+            process_count,
+            plugin_name,
+            ordered,
+            chunksize,
+            max_concurrent_requests,
+            max_pending_corpora,
+            response_cache,
+        )
+
+
+def iter_multi_round_workflow(
+    start_nodes,
+    edges,
+    graph,
+    component_sizes,
+    neighbor_count,
+    max_sequence_length,
+    random_prop,
+    process_count,
+    plugin_name,
+    edge_index=None,
+    max_candidates=None,
+    adjacency_cache_size=None,
+    shared_memory=False,
+    ordered=False,
+    results_path=None,
+    max_concurrent_requests=None,
+    max_pending_corpora=None,
+    response_cache=None,
+    random_seed=None,
+):
+    """Run the workflow, yielding (start_node, natural_language_text, response) tuples.
+
+    Results are yielded as soon as each start node is done, in completion
+    order, or in the order of start_nodes with ordered. With results_path,
+    every result is also written to that JSONL file as it arrives, so an
+    interrupted run keeps the results finished so far. Closing the
+    generator early stops the workers.
+
+    By default each of the process_count workers generates a corpus and
+    then waits for its LLM response. With max_concurrent_requests, the
+    workers only generate corpora, at most max_pending_corpora (default
+    2 * max_concurrent_requests) ahead of the LLM stage, while a thread
+    pool in this process keeps up to max_concurrent_requests LLM requests
+    in flight, e.g. the --max-num-seqs of a vLLM server.
+
+    edge_index (see build_edge_index) is built here when not given, and
+    only without shared_memory, whose store indexes the edges itself.
+    With shared_memory, a worker walks the start nodes of each chunk of
+    tasks together, with batched_depth_first_walker.
+    adjacency_cache_size gives every worker an AdjacencyCache of that many
+    pairs when graph is a CSRGraph; the set-based graphs test adjacency
+    faster without one.
+
+    With random_seed, the walk of every start node is seeded by
+    random_seed and its position in start_nodes, so a re-run generates the
+    same corpora whichever worker runs each task. Walks follow the order of
+    the neighbors, so a graph with set neighbors, whose order depends on
+    PYTHONHASHSEED, is first copied with sorted neighbors; build it with
+    build_undirected_graph(edges, ordered=True) to avoid the copy. With
+    a ResponseCache as response_cache, queries answered before, in this or
+    an earlier run, are read from the cache instead of sent to the LLM.
+    """
+    start_nodes = list(start_nodes)
+    results = _iter_workflow_results(
+        start_nodes,
         edges,
         graph,
         component_sizes,
         neighbor_count,
         max_sequence_length,
         random_prop,
+        process_count,
+        plugin_name,
+        edge_index,
+        max_candidates,
+        adjacency_cache_size,
+        shared_memory,
+        ordered,
+        max_concurrent_requests,
+        max_pending_corpora,
+        response_cache,
+        random_seed,
     )
-
-    # Interact with LLM
-    response = query_llm_using_plugin(natural_language_text, plugin_name)
-
-    return natural_language_text, response
+    results_file = None
+    if results_path is not None:
+        results_file = open(results_path, "w", encoding="utf-8")
+    try:
+        for start_node, natural_language_text, response in tqdm(
+            results, total=len(start_nodes), desc="Multiprocessing Workflow"
+        ):
+            if results_file is not None:
+                record = {
+                    "start_node": start_node,
+                    "natural_language_text": natural_language_text,
+                    "response": response,
+                }
+                results_file.write(json.dumps(record) + "\n")
+                results_file.flush()
+            yield start_node, natural_language_text, response
+    finally:
+        results.close()
+        if results_file is not None:
+            results_file.close()
+        if response_cache is not None:
+            response_cache.flush()
 
 
 def multi_round_workflow(
@@ -44,30 +436,99 @@ def multi_round_workflow(
     random_prop,
     process_count,
     plugin_name,
+    edge_index=None,
+    max_candidates=None,
+    adjacency_cache_size=None,
+    shared_memory=False,
+    results_path=None,
+    max_concurrent_requests=None,
+    response_cache=None,
+    random_seed=None,
 ):
-    # Multiprocessing workflow execution with a large mount of start nodes
-    task_args = []
-    for start_node in start_nodes:
-        task_args = (
-            start_node,
+    results = list(
+        iter_multi_round_workflow(
+            start_nodes,
             edges,
             graph,
             component_sizes,
             neighbor_count,
             max_sequence_length,
             random_prop,
+            process_count,
             plugin_name,
+            edge_index,
+            max_candidates,
+            adjacency_cache_size,
+            shared_memory,
+            ordered=True,
+            results_path=results_path,
+            max_concurrent_requests=max_concurrent_requests,
+            response_cache=response_cache,
+            random_seed=random_seed,
         )
-        task_args.append(task_args)
-
-    with Pool(processes=process_count) as pool:
-        results = list(
-            tqdm(
-                pool.map(workflow, task_args),
-                total=len(task_args),
-                desc="Multiprocessing Workflow",
-            )
-        )
-        natural_language_texts, responses = zip(*results)
+    )
+    _, natural_language_texts, responses = zip(*results)
 
     return natural_language_texts, responses
+
+
+class _StubLLMHandler(BaseHTTPRequestHandler):
+    """Chat completions endpoint answering every query with its length."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        content = json.dumps({"choices": [{"message": {"content": f"echo:{len(body)}"}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def check_response_cache_stats(process_count=4, start_node_count=20):
+    """Run a pooled, seeded workflow twice against a stub LLM server and check the cache counters.
+
+    The second run must send no request and count one hit per start node,
+    although the lookups happen in pool workers.
+    """
+    edges = [
+        {"line": line, "subject": f"process{line % 7}", "event": "EVENT_READ", "object": f"file{line}"}
+        for line in range(100)
+    ]
+    graph = build_undirected_graph(edges, ordered=True)
+    component_sizes = compute_connected_components(graph)
+    neighbor_count = {node: len(neighbors) for node, neighbors in graph.items()}
+    start_nodes = list(graph)[:start_node_count]
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLMHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    query_llm.API_URL = f"http://127.0.0.1:{server.server_port}/v1"
+    query_llm.MODEL, query_llm.MAX_TOKENS, query_llm.TEMPERATURE, query_llm.TOP_P = "stub", 16, 0.8, 0.95
+
+    with tempfile.TemporaryDirectory() as dirname:
+        response_cache = ResponseCache(os.path.join(dirname, "responses.sqlite"))
+        try:
+            for run in range(2):
+                requests_before = server.requests
+                hits_before = response_cache.stats()["hits"]
+                multi_round_workflow(
+                    start_nodes, edges, graph, component_sizes, neighbor_count, 10, 0.2,
+                    process_count, "Plugin1", response_cache=response_cache, random_seed=0,
+                )
+                stats = response_cache.stats()
+                print(f"Run {run}: {server.requests - requests_before} LLM requests, cache {stats}")
+            assert server.requests == requests_before, "the second run queried the LLM"
+            assert stats["hits"] - hits_before == len(start_nodes), "the second run lost cache hits"
+        finally:
+            response_cache.close()
+            server.shutdown()
+    print("Response cache counters match the requests")
+
+
+if __name__ == "__main__":
+    check_response_cache_stats()
@@ -9,10 +9,24 @@ def main():
     darpa = subparsers.add_parser('darpa_e3')
     darpa.add_argument('--data-files', nargs='+', required=True)
     darpa.add_argument('--edge-files', nargs='+', required=True)
+    darpa.add_argument('--single-pass', action='store_true')
+    darpa.add_argument('--workers', type=int, default=1)
+    darpa.add_argument('--extractor', choices=['regex', 'slice'], default='regex')
+    darpa.add_argument('--max-edges-in-memory', type=int, default=None)
+    darpa.add_argument('--compact-node-table', action='store_true')
+    darpa.add_argument('--output-format', choices=['jsonl', 'npy'], default='jsonl')
+    darpa.add_argument('--keep-timestamp', action='store_true')
+    darpa.add_argument('--checkpoint', default=None)
     
     optc = subparsers.add_parser('optc')
-    optc.add_argument('--input-filename', required=True)
+    optc.add_argument('--input-filename', nargs='+', required=True)
+    optc.add_argument('--host-id', default=None)
     optc.add_argument('--output-filename', required=True)
+    optc.add_argument('--output-format', choices=['jsonl', 'npy'], default='jsonl')
+    optc.add_argument('--workers', type=int, default=1)
+    optc.add_argument('--dedup', choices=['exact', 'hash', 'bloom'], default='exact')
+    optc.add_argument('--dedup-capacity', type=int, default=None)
+    optc.add_argument('--checkpoint', default=None)
     
     args = parser.parse_args()
     
@@ -20,13 +34,27 @@ def main():
         parse(
             mode='darpa_e3',
             data_files=args.data_files,
-            edge_files=args.edge_files
+            edge_files=args.edge_files,
+            single_pass=args.single_pass,
+            workers=args.workers,
+            extractor=args.extractor,
+            max_edges_in_memory=args.max_edges_in_memory,
+            compact_node_table=args.compact_node_table,
+            output_format=args.output_format,
+            keep_timestamp=args.keep_timestamp,
+            checkpoint_path=args.checkpoint
         )
     elif args.mode == 'optc':
         parse(
             mode='optc',
             input_filename=args.input_filename,
-            output_filename=args.output_filename
+            output_filename=args.output_filename,
+            output_format=args.output_format,
+            workers=args.workers,
+            dedup=args.dedup,
+            dedup_capacity=args.dedup_capacity,
+            host_id=args.host_id,
+            checkpoint_path=args.checkpoint
         )
 
 
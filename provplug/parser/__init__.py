@@ -14,10 +14,24 @@ def parse(mode: str, **kwargs) -> None:
         - archive_file: Path to the tar.gz archive file
         - data_files: List of data file paths to process
         - edge_files: List of edge file paths to process
+        - single_pass: Read each data shard once, collecting nodes and edges together
+        - workers: Number of worker processes for parsing shards and edge files
+        - extractor: Event field extractor, either 'regex' or 'slice'
+        - max_edges_in_memory: Spill edges to sorted runs on disk beyond this many
+        - compact_node_table: Store the node type map as a NodeTypeTable (requires numpy)
+        - output_format: Edge output format, either 'jsonl' or 'npy' (columnar)
+        - keep_timestamp: Keep timestamps in JSONL records and write a time index
+        - checkpoint_path: Resume from and update this checkpoint, appending new edges
 
     For 'optc' mode:
-        - input_filename: Path to input JSONL file
-        - output_filename: Path to output JSONL file
+        - input_filename: Path (or list of paths) to input JSONL files or `.json.gz` archives
+        - host_id: Only keep records of this host, e.g. '0201'
+        - output_filename: Path to output JSONL file (or directory for 'npy')
+        - output_format: Edge output format, either 'jsonl' or 'npy' (columnar)
+        - workers: Number of worker processes decoding chunks of the input
+        - dedup: Repeated edge filter, either 'exact', 'hash' or 'bloom'
+        - dedup_capacity: Number of distinct edges the 'bloom' filter is sized for
+        - checkpoint_path: Resume from and update this checkpoint, appending new edges
 
     Raises:
         ValueError: If mode is not recognized
@@ -26,11 +40,25 @@ def parse(mode: str, **kwargs) -> None:
         darpa_e3.parse(
             data_files=kwargs.get("data_files", []),
             edge_files=kwargs.get("edge_files", []),
+            single_pass=kwargs.get("single_pass", False),
+            workers=kwargs.get("workers", 1),
+            extractor=kwargs.get("extractor", "regex"),
+            max_edges_in_memory=kwargs.get("max_edges_in_memory"),
+            compact_node_table=kwargs.get("compact_node_table", False),
+            output_format=kwargs.get("output_format", "jsonl"),
+            keep_timestamp=kwargs.get("keep_timestamp", False),
+            checkpoint_path=kwargs.get("checkpoint_path"),
         )
     elif mode == "optc":
         optc.parse(
             input_filename=kwargs.get("input_filename"),
             output_filename=kwargs.get("output_filename"),
+            output_format=kwargs.get("output_format", "jsonl"),
+            workers=kwargs.get("workers", 1),
+            dedup=kwargs.get("dedup", "exact"),
+            dedup_capacity=kwargs.get("dedup_capacity"),
+            host_id=kwargs.get("host_id"),
+            checkpoint_path=kwargs.get("checkpoint_path"),
         )
     else:
         raise ValueError(
@@ -44,4 +72,5 @@ __all__ = [
     "optc",
     "build_undirected_graph",
     "build_directed_graph",
+    "CSRGraph",
 ]
@@ -0,0 +1,75 @@
+import os
+import pickle
+
+from .edge_writer import TIME_INDEX_SUFFIX
+
+
+class ParseCheckpoint:
+    """Resumable parser state stored in a pickle file.
+
+    Tracks, per input file, the byte offset up to which complete lines have
+    been parsed, the size and line count of every output, and parser state
+    such as the node map and dedup filters under `state`. Saving is atomic,
+    so an interrupted run leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+            self.offsets = saved["offsets"]
+            self.state = saved["state"]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"offsets": self.offsets, "state": self.state}, f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, self.path)
+
+    def iter_new_lines(self, input_file, key=None):
+        """Yield the complete lines appended to input_file since the last checkpoint.
+
+        A trailing line without a newline is still being written and is left
+        for the next run. key distinguishes several passes over the same file.
+        """
+        key = key or os.path.abspath(input_file)
+        offset = self.offsets.get(key, 0)
+        if os.path.getsize(input_file) < offset:
+            print(f"{input_file} shrank since the last checkpoint, parsing it from the start")
+            offset = 0
+
+        with open(input_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                self.offsets[key] = offset
+                yield line.decode("utf-8")
+
+    def restore_output(self, output_path):
+        """Cut output appended after the last checkpoint, returning its line count.
+
+        This drops whatever an interrupted run wrote (including its time index
+        entries), since the input offsets of that run were never saved and its
+        records will be parsed again.
+        """
+        sizes, line_count = self.state.get(("output", os.path.abspath(output_path)), ((0, 0), 0))
+        for path, size in zip((output_path, output_path + TIME_INDEX_SUFFIX), sizes):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        return line_count
+
+    def record_output(self, output_path, line_count):
+        index_path = output_path + TIME_INDEX_SUFFIX
+        sizes = (
+            os.path.getsize(output_path),
+            os.path.getsize(index_path) if os.path.exists(index_path) else 0,
+        )
+        self.state[("output", os.path.abspath(output_path))] = (sizes, line_count)
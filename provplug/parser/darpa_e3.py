@@ -1,7 +1,16 @@
 import re
 import os
-import json
-from typing import Optional, Dict, List, Tuple
+import heapq
+import shutil
+import tempfile
+import timeit
+from multiprocessing import Pool
+from operator import itemgetter
+from typing import Optional, Dict, List, Tuple, Iterator
+
+from .dedup import HashedEdgeSet
+from .edge_writer import open_edge_writer, JsonlEdgeWriter, OUTPUT_SUFFIXES
+from .checkpoint import ParseCheckpoint
 
 
 UUID_PATTERN = re.compile(r'uuid\":\"(.*?)\"')
@@ -11,6 +20,13 @@ DST1_PATTERN = re.compile(r'predicateObject\":{\"com.bbn.tc.schema.avro.cdm18.UU
 DST2_PATTERN = re.compile(r'predicateObject2\":{\"com.bbn.tc.schema.avro.cdm18.UUID\":\"(.*?)\"}')
 TIMESTAMP_PATTERN = re.compile(r'timestampNanos\":(.*?),')
 
+# Literal prefixes of the patterns above, used by the slicing extractor
+TYPE_PREFIX = 'type":"'
+SRC_PREFIX = 'subject":{"com.bbn.tc.schema.avro.cdm18.UUID":"'
+DST1_PREFIX = 'predicateObject":{"com.bbn.tc.schema.avro.cdm18.UUID":"'
+DST2_PREFIX = 'predicateObject2":{"com.bbn.tc.schema.avro.cdm18.UUID":"'
+TIMESTAMP_PREFIX = 'timestampNanos":'
+
 EVENT_TYPE = 'com.bbn.tc.schema.avro.cdm18.Event'
 HOST_TYPE = 'com.bbn.tc.schema.avro.cdm18.Host'
 TIME_MARKER_TYPE = 'com.bbn.tc.schema.avro.cdm18.TimeMarker'
@@ -22,6 +38,8 @@ NETFLOW_OBJECT_TYPE = 'com.bbn.tc.schema.avro.cdm18.NetFlowObject'
 UNNAMED_PIPE_OBJECT_TYPE = 'com.bbn.tc.schema.avro.cdm18.UnnamedPipeObject'
 
 REPORT_INTERVAL = 1000000
+# Events whose endpoints are looked up in the node map together
+LOOKUP_BATCH_SIZE = 65536
 
 def extract_uuid(line: str) -> Optional[str]:
     matches = UUID_PATTERN.findall(line)
@@ -56,6 +74,73 @@ def extract_edge_info(line: str) -> Tuple[Optional[str], Optional[str], Optional
 
     return src_id, edge_type, timestamp, dst_id1, dst_id2
 
+def _slice_field(line: str, prefix: str, terminator: str) -> Optional[str]:
+    """Return the text between the first occurrence of prefix and the next terminator"""
+    start = line.find(prefix)
+    if start == -1:
+        return None
+    start += len(prefix)
+    end = line.find(terminator, start)
+    if end == -1:
+        return None
+    return line[start:end]
+
+def extract_edge_info_slice(line: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """Offset-based equivalent of extract_edge_info for CDM18 event records
+
+    Each field is located with str.find and sliced out directly instead of
+    running a regex scan and building a list of every match.
+    """
+    edge_type = _slice_field(line, TYPE_PREFIX, '"')
+    if not edge_type:
+        return None, None, None, None, None
+
+    timestamp = _slice_field(line, TIMESTAMP_PREFIX, ',')
+    if timestamp is None:
+        return None, None, None, None, None
+
+    src_id = _slice_field(line, SRC_PREFIX, '"}')
+    if src_id is None:
+        return None, None, None, None, None
+
+    dst_id1 = _slice_field(line, DST1_PREFIX, '"}')
+    if dst_id1 == 'null':
+        dst_id1 = None
+    dst_id2 = _slice_field(line, DST2_PREFIX, '"}')
+    if dst_id2 == 'null':
+        dst_id2 = None
+
+    return src_id, edge_type, timestamp, dst_id1, dst_id2
+
+EDGE_EXTRACTORS = {
+    'regex': extract_edge_info,
+    'slice': extract_edge_info_slice,
+}
+
+def benchmark_edge_extractors(file_path: str, sample_size: int = 100000, repeat: int = 5) -> Dict[str, float]:
+    """Time every edge extractor on a sample of event lines from a CDM18 file
+
+    Checks that all extractors agree with the regex one on the sample and
+    returns the best time per line in nanoseconds for each extractor.
+    """
+    lines = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            if EVENT_TYPE in line:
+                lines.append(line)
+                if len(lines) >= sample_size:
+                    break
+
+    expected = [extract_edge_info(line) for line in lines]
+    results = {}
+    for name, extractor in EDGE_EXTRACTORS.items():
+        if [extractor(line) for line in lines] != expected:
+            raise ValueError(f"Extractor '{name}' disagrees with 'regex' on {file_path}")
+        best = min(timeit.repeat(lambda: [extractor(line) for line in lines], number=1, repeat=repeat))
+        results[name] = best / max(len(lines), 1) * 1e9
+        print(f"{name}: {results[name]:.0f} ns/line over {len(lines)} event lines")
+    return results
+
 
 SKIP_TYPES = [EVENT_TYPE, HOST_TYPE, TIME_MARKER_TYPE, START_MARKER_TYPE,
               UNIT_DEPENDENCY_TYPE, END_MARKER_TYPE]
@@ -77,36 +162,67 @@ def _extract_special_object_type(line: str) -> Optional[str]:
             return type_name
     return None
 
-def process_data(file_path: str, id_nodetype_map: Dict[str, str]) -> Dict[str, str]:
-    """Parse node data from CDM18 records and build ID to node type mapping"""
+def _shard_paths(file_path: str) -> List[str]:
+    """List the existing shards of a CDM18 file family (file_path, file_path.1, ...)"""
+    shard_paths = []
     for file_index in range(100):
         current_path = file_path if file_index == 0 else f"{file_path}.{file_index}"
 
         if not os.path.exists(current_path):
             break
+        shard_paths.append(current_path)
+    return shard_paths
+
+def _process_node_line(line: str, id_nodetype_map: Dict[str, str]) -> None:
+    """Record the node type of a non-event CDM18 record"""
+    node_id = extract_uuid(line)
+    if not node_id:
+        return
+
+    node_type = extract_subject_type(line)
+
+    if not node_type:
+        special_type = _extract_special_object_type(line)
+        if special_type:
+            id_nodetype_map[node_id] = special_type
+    else:
+        id_nodetype_map[node_id] = node_type
+
+def _process_data_shard(shard_path: str, id_nodetype_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Parse node data from a single shard, returning its (partial) node map"""
+    if id_nodetype_map is None:
+        id_nodetype_map = {}
+
+    with open(shard_path, 'r') as f:
+        line_count = 0
+        for line in f:
+            line_count += 1
+            if line_count % REPORT_INTERVAL == 0:
+                print(f"Processed {line_count} lines")
 
-        with open(current_path, 'r') as f:
-            line_count = 0
-            for line in f:
-                line_count += 1
-                if line_count % REPORT_INTERVAL == 0:
-                    print(f"Processed {line_count} lines")
+            if _should_skip_line(line):
+                continue
 
-                if _should_skip_line(line):
-                    continue
+            _process_node_line(line, id_nodetype_map)
 
-                node_id = extract_uuid(line)
-                if not node_id:
-                    continue
+    return id_nodetype_map
+
+def process_data(file_path: str, id_nodetype_map: Dict[str, str], workers: int = 1) -> Dict[str, str]:
+    """Parse node data from CDM18 records and build ID to node type mapping
 
-                node_type = extract_subject_type(line)
+    With workers > 1 every shard is parsed in its own worker process and the
+    partial node maps are merged in shard order.
+    """
+    shard_paths = _shard_paths(file_path)
 
-                if not node_type:
-                    special_type = _extract_special_object_type(line)
-                    if special_type:
-                        id_nodetype_map[node_id] = special_type
-                else:
-                    id_nodetype_map[node_id] = node_type
+    if workers > 1 and len(shard_paths) > 1:
+        with Pool(processes=min(workers, len(shard_paths))) as pool:
+            for partial_map in pool.imap(_process_data_shard, shard_paths):
+                id_nodetype_map.update(partial_map)
+        return id_nodetype_map
+
+    for current_path in shard_paths:
+        _process_data_shard(current_path, id_nodetype_map)
 
     return id_nodetype_map
 
@@ -121,52 +237,404 @@ def _add_edge(edges: List[Dict], src_id: str, edge_type: str,
             "timestamp": int(timestamp)
         })
 
-def process_edges(file_path: str, id_nodetype_map: Dict[str, str]) -> None:
+def _add_event_edges(edges: List[Dict], edge_info: Tuple, id_nodetype_map: Dict) -> None:
+    src_id, edge_type, timestamp, dst_id1, dst_id2 = edge_info
+
+    if not src_id or src_id not in id_nodetype_map:
+        return
+
+    _add_edge(edges, src_id, edge_type, dst_id1, timestamp, id_nodetype_map)
+    _add_edge(edges, src_id, edge_type, dst_id2, timestamp, id_nodetype_map)
+
+def _lookup_map(edge_infos: List[Tuple], id_nodetype_map: Dict) -> Dict:
+    """Return what to test the endpoints of a batch of events against
+
+    A NodeTypeTable is asked once for the known endpoints of the whole batch,
+    with vectorized lookups, instead of once per endpoint; a dict is used as is.
+    """
+    known = getattr(id_nodetype_map, 'known', None)
+    if known is None:
+        return id_nodetype_map
+    return known({node_id for edge_info in edge_infos
+                  for node_id in (edge_info[0], edge_info[3], edge_info[4]) if node_id})
+
+def _iter_event_batches(lines: Iterator[str], extract) -> Iterator[List[Tuple]]:
+    """Extract the edge info of event records in batches of LOOKUP_BATCH_SIZE"""
+    edge_infos: List[Tuple] = []
+    line_count = 0
+    for line in lines:
+        line_count += 1
+        if line_count % REPORT_INTERVAL == 0:
+            print(f"Processed {line_count} lines")
+
+        if EVENT_TYPE not in line:
+            continue
+
+        edge_infos.append(extract(line))
+        if len(edge_infos) >= LOOKUP_BATCH_SIZE:
+            yield edge_infos
+            edge_infos = []
+    if edge_infos:
+        yield edge_infos
+
+def _is_resolved(edge_info: Tuple, id_nodetype_map: Dict) -> bool:
+    """Check if every endpoint of an event is already in the node map"""
+    src_id, _, _, dst_id1, dst_id2 = edge_info
+    return (src_id in id_nodetype_map
+            and (not dst_id1 or dst_id1 in id_nodetype_map)
+            and (not dst_id2 or dst_id2 in id_nodetype_map))
+
+def _write_edges(edges: List[Dict], output_path: str, output_format: str = 'jsonl',
+                 keep_timestamp: bool = False) -> None:
+    """Sort edges by timestamp and write them deduplicated to the output"""
+    edges.sort(key=lambda edge: edge["timestamp"])
+    written = set()
+    with open_edge_writer(output_path, output_format, keep_timestamp) as writer:
+        for edge in edges:
+            edge_key = (edge["subject"], edge["event"], edge["object"])
+            if edge_key not in written:
+                writer.write(edge["subject"], edge["event"], edge["object"], edge["timestamp"])
+                written.add(edge_key)
+
+def _spill_run(edges: List[Dict], run_dir: str, run_index: int) -> str:
+    """Write edges sorted by timestamp to a tab-separated run file"""
+    edges.sort(key=lambda edge: edge["timestamp"])
+    run_path = os.path.join(run_dir, f"run-{run_index:05d}.tsv")
+    with open(run_path, 'w') as run_file:
+        for edge in edges:
+            run_file.write(f"{edge['timestamp']}\t{edge['subject']}\t{edge['event']}\t{edge['object']}\n")
+    return run_path
+
+def _read_run(run_path: str) -> Iterator[Tuple[int, str, str, str]]:
+    with open(run_path, 'r') as run_file:
+        for line in run_file:
+            timestamp, subject, event, obj = line.rstrip('\n').split('\t')
+            yield int(timestamp), subject, event, obj
+
+def _merge_runs(run_paths: List[str], output_path: str, output_format: str = 'jsonl',
+                keep_timestamp: bool = False) -> None:
+    """K-way merge sorted runs by timestamp and write them deduplicated to the output
+
+    heapq.merge is stable, so edges with equal timestamps keep their original
+    order and the output matches _write_edges.
+    """
+    written = HashedEdgeSet()
+    runs = [_read_run(run_path) for run_path in run_paths]
+    with open_edge_writer(output_path, output_format, keep_timestamp) as writer:
+        for timestamp, subject, event, obj in heapq.merge(*runs, key=itemgetter(0)):
+            if written.add_if_new(subject, event, obj):
+                writer.write(subject, event, obj, timestamp)
+
+def process_edges(file_path: str, id_nodetype_map: Dict[str, str], extractor: str = 'regex',
+                  max_edges_in_memory: Optional[int] = None, output_format: str = 'jsonl',
+                  keep_timestamp: bool = False) -> None:
+    """Extract edges from event records and write them sorted by timestamp
+
+    With max_edges_in_memory set, edges are spilled to sorted runs on disk
+    whenever the buffer is full and k-way merged into the output, bounding
+    memory by the buffer size instead of the file size.
+    """
+    extract = EDGE_EXTRACTORS[extractor]
+    output_path = f"{file_path}{OUTPUT_SUFFIXES[output_format]}"
     edges: List[Dict] = []
+    run_dir = None
+    run_paths: List[str] = []
+
+    try:
+        with open(file_path, 'r') as f:
+            for edge_infos in _iter_event_batches(f, extract):
+                lookup = _lookup_map(edge_infos, id_nodetype_map)
+                for edge_info in edge_infos:
+                    _add_event_edges(edges, edge_info, lookup)
+
+                    if max_edges_in_memory and len(edges) >= max_edges_in_memory:
+                        if run_dir is None:
+                            run_dir = tempfile.mkdtemp(prefix='edge-runs-', dir=os.path.dirname(output_path) or '.')
+                        run_paths.append(_spill_run(edges, run_dir, len(run_paths)))
+                        edges = []
+
+        if not run_paths:
+            _write_edges(edges, output_path, output_format, keep_timestamp)
+            return
+
+        if edges:
+            run_paths.append(_spill_run(edges, run_dir, len(run_paths)))
+            edges = []
+        print(f"Merging {len(run_paths)} sorted runs into {output_path}")
+        _merge_runs(run_paths, output_path, output_format, keep_timestamp)
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+def _spill_sequenced_run(edges: List[Dict], line_numbers: List[int], run_path: str) -> None:
+    """Write edges with the line of their event, sorted by timestamp, to a tab-separated run file"""
+    with open(run_path, 'w') as run_file:
+        for edge, line_number in sorted(zip(edges, line_numbers), key=lambda pair: pair[0]["timestamp"]):
+            run_file.write(f"{edge['timestamp']}\t{line_number}\t{edge['subject']}\t{edge['event']}\t{edge['object']}\n")
+
+def _read_sequenced_run(run_path: str) -> Iterator[Tuple[int, int, str, str, str]]:
+    with open(run_path, 'r') as run_file:
+        for line in run_file:
+            timestamp, line_number, subject, event, obj = line.rstrip('\n').split('\t')
+            yield int(timestamp), int(line_number), subject, event, obj
+
+def _resolve_events(events: List[Tuple[int, Tuple]], id_nodetype_map: Dict, edges: List[Dict],
+                    line_numbers: List[int], pending: List[Tuple[int, Tuple]]) -> None:
+    """Add the edges of the (line, edge info) events whose endpoints are known and hold back the others"""
+    lookup = _lookup_map([edge_info for _, edge_info in events], id_nodetype_map)
+    for line_number, edge_info in events:
+        if _is_resolved(edge_info, lookup):
+            _add_event_edges(edges, edge_info, lookup)
+            line_numbers.extend([line_number] * (len(edges) - len(line_numbers)))
+        else:
+            pending.append((line_number, edge_info))
+
+def _write_held_back(output_path: str, run_path: str, pending: List[Tuple[int, Tuple]],
+                     id_nodetype_map: Dict, output_format: str = 'jsonl',
+                     keep_timestamp: bool = False) -> None:
+    """Merge the spilled edges of a shard with its held-back events, resolved now
+
+    Both are ordered by (timestamp, event line), which is the order the stable
+    sort of _write_edges gives, so the output matches the two-pass parse.
+    """
+    resolved: List[Tuple[int, int, str, str, str]] = []
+    for start in range(0, len(pending), LOOKUP_BATCH_SIZE):
+        batch = pending[start:start + LOOKUP_BATCH_SIZE]
+        lookup = _lookup_map([edge_info for _, edge_info in batch], id_nodetype_map)
+        for line_number, edge_info in batch:
+            edges: List[Dict] = []
+            _add_event_edges(edges, edge_info, lookup)
+            resolved.extend((edge["timestamp"], line_number, edge["subject"], edge["event"], edge["object"])
+                            for edge in edges)
+    resolved.sort(key=itemgetter(0, 1))
 
-    with open(file_path, 'r') as f:
-        line_count = 0
-        for line in f:
-            line_count += 1
-            if line_count % REPORT_INTERVAL == 0:
-                print(f"Processed {line_count} lines")
+    written = set()
+    merged = heapq.merge(_read_sequenced_run(run_path), resolved, key=itemgetter(0, 1))
+    with open_edge_writer(output_path, output_format, keep_timestamp) as writer:
+        for timestamp, _, subject, event, obj in merged:
+            edge_key = (subject, event, obj)
+            if edge_key not in written:
+                writer.write(subject, event, obj, timestamp)
+                written.add(edge_key)
 
-            if EVENT_TYPE not in line:
-                continue
+def process_single_pass(data_files: List[str], id_nodetype_map: Dict[str, str],
+                        edge_files: List[str], extractor: str = 'regex',
+                        output_format: str = 'jsonl', keep_timestamp: bool = False) -> Dict[str, str]:
+    """Parse node data and edges of CDM18 file families reading each shard once
+
+    Events are looked up in batches; those whose endpoints are not in the
+    node map yet by the end of their batch are held back and resolved after
+    the last shard of every family, so nodes declared later, in any shard of
+    any of data_files, are still found and the output matches the two-pass
+    parse. Shards without such events are written as soon as they are read.
+    The resolved edges of the others are spilled to a sorted run in a
+    temporary directory next to their output, so only the held-back events
+    stay in memory. Only shards listed in edge_files produce an output.
+    """
+    extract = EDGE_EXTRACTORS[extractor]
+    edge_paths = {os.path.abspath(edge_file) for edge_file in edge_files}
+    # (output path, run path, held-back events) of shards waiting for later node records
+    held_back: List[Tuple[str, str, List[Tuple[int, Tuple]]]] = []
+    run_dir = None
+
+    try:
+        for data_file in data_files:
+            for current_path in _shard_paths(data_file):
+                collect_edges = os.path.abspath(current_path) in edge_paths
+                edges: List[Dict] = []
+                # Line of the event of every edge, to merge held-back events back in order
+                line_numbers: List[int] = []
+                # (line, edge info) of events with unresolved endpoints
+                pending: List[Tuple[int, Tuple]] = []
+                # (line, edge info) of events not looked up yet
+                events: List[Tuple[int, Tuple]] = []
+
+                with open(current_path, 'r') as f:
+                    line_count = 0
+                    for line in f:
+                        line_count += 1
+                        if line_count % REPORT_INTERVAL == 0:
+                            print(f"Processed {line_count} lines")
+
+                        if EVENT_TYPE in line:
+                            if not collect_edges:
+                                continue
+                            edge_info = extract(line)
+                            if not edge_info[0]:
+                                continue
+                            events.append((line_count, edge_info))
+                            if len(events) >= LOOKUP_BATCH_SIZE:
+                                _resolve_events(events, id_nodetype_map, edges, line_numbers, pending)
+                                events = []
+                            continue
+
+                        if _should_skip_line(line):
+                            continue
+
+                        _process_node_line(line, id_nodetype_map)
+
+                if not collect_edges:
+                    continue
+                _resolve_events(events, id_nodetype_map, edges, line_numbers, pending)
+                output_path = f"{current_path}{OUTPUT_SUFFIXES[output_format]}"
+                if not pending:
+                    _write_edges(edges, output_path, output_format, keep_timestamp)
+                    continue
+                if run_dir is None:
+                    run_dir = tempfile.mkdtemp(prefix='held-back-', dir=os.path.dirname(output_path) or '.')
+                run_path = os.path.join(run_dir, f"run-{len(held_back):05d}.tsv")
+                _spill_sequenced_run(edges, line_numbers, run_path)
+                held_back.append((output_path, run_path, pending))
+
+        for output_path, run_path, pending in held_back:
+            print(f"Resolving {len(pending)} held-back events into {output_path}")
+            _write_held_back(output_path, run_path, pending, id_nodetype_map, output_format,
+                             keep_timestamp)
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
 
-            src_id, edge_type, timestamp, dst_id1, dst_id2 = extract_edge_info(line)
+    return id_nodetype_map
 
-            if not src_id or src_id not in id_nodetype_map:
+
+def process_data_incremental(file_path: str, id_nodetype_map: Dict[str, str],
+                             checkpoint: ParseCheckpoint) -> Dict[str, str]:
+    """Parse the node data appended to a CDM18 file family since the last checkpoint"""
+    for current_path in _shard_paths(file_path):
+        for line in checkpoint.iter_new_lines(current_path, key=f"data:{os.path.abspath(current_path)}"):
+            if _should_skip_line(line):
                 continue
 
-            _add_edge(edges, src_id, edge_type, dst_id1, timestamp, id_nodetype_map)
-            _add_edge(edges, src_id, edge_type, dst_id2, timestamp, id_nodetype_map)
+            _process_node_line(line, id_nodetype_map)
 
-    edges.sort(key=lambda edge: edge["timestamp"])
+    return id_nodetype_map
+
+def process_edges_incremental(file_path: str, id_nodetype_map: Dict[str, str],
+                              checkpoint: ParseCheckpoint, extractor: str = 'regex',
+                              keep_timestamp: bool = False) -> None:
+    """Append the edges of events added to file_path since the last checkpoint
+
+    New edges are sorted by timestamp among themselves and deduplicated
+    against every edge written by earlier runs.
+    """
+    extract = EDGE_EXTRACTORS[extractor]
     output_path = f"{file_path}.jsonl"
-    written = set()
-    with open(output_path, 'w') as output_file:
-        for edge in edges:
-            edge_key = (edge["subject"], edge["event"], edge["object"])
-            if edge_key not in written:
-                json_record = {
-                    "subject": edge["subject"],
-                    "event": edge["event"],
-                    "object": edge["object"]
-                }
-                output_file.write(json.dumps(json_record) + '\n')
-                written.add(edge_key)
+    line_count = checkpoint.restore_output(output_path)
+    written = checkpoint.state.setdefault(("written", os.path.abspath(output_path)), HashedEdgeSet())
+
+    edges: List[Dict] = []
+    new_lines = checkpoint.iter_new_lines(file_path, key=f"edges:{os.path.abspath(file_path)}")
+    for edge_infos in _iter_event_batches(new_lines, extract):
+        lookup = _lookup_map(edge_infos, id_nodetype_map)
+        for edge_info in edge_infos:
+            _add_event_edges(edges, edge_info, lookup)
 
+    edges.sort(key=lambda edge: edge["timestamp"])
+    with JsonlEdgeWriter(output_path, keep_timestamp, append=True, line_count=line_count) as writer:
+        for edge in edges:
+            if written.add_if_new(edge["subject"], edge["event"], edge["object"]):
+                writer.write(edge["subject"], edge["event"], edge["object"], edge["timestamp"])
+    checkpoint.record_output(output_path, writer.line_count)
+    print(f"Appended {writer.line_count - line_count} edges to {output_path}")
+
+def _parse_incremental(data_files: List[str], edge_files: List[str], checkpoint_path: str,
+                       extractor: str, compact_node_table: bool, keep_timestamp: bool) -> None:
+    checkpoint = ParseCheckpoint(checkpoint_path)
+    node_type_map = checkpoint.state.get("node_type_map")
+    if node_type_map is None:
+        if compact_node_table:
+            from .node_table import NodeTypeTable
+            node_type_map = NodeTypeTable()
+        else:
+            node_type_map = {}
+        checkpoint.state["node_type_map"] = node_type_map
 
-def parse(data_files: List[str], edge_files: List[str]) -> None:
-    node_type_map: Dict[str, str] = {}
     for data_file in data_files:
-        process_data(data_file, node_type_map)
+        process_data_incremental(data_file, node_type_map, checkpoint)
         print(f"Processed node data: {len(node_type_map)} nodes")
 
     for edge_file in edge_files:
         print(f"Processing edges from: {edge_file}")
-        process_edges(edge_file, node_type_map)
+        process_edges_incremental(edge_file, node_type_map, checkpoint, extractor=extractor,
+                                  keep_timestamp=keep_timestamp)
+
+    checkpoint.save()
+
+
+# Node map shared with edge workers, inherited by fork instead of sent per task
+_worker_node_type_map: Dict[str, str] = {}
+_worker_edge_options: Dict = {}
+
+def _init_edge_worker(id_nodetype_map: Dict[str, str], edge_options: Dict) -> None:
+    global _worker_node_type_map, _worker_edge_options
+    _worker_node_type_map = id_nodetype_map
+    _worker_edge_options = edge_options
+
+def _process_edges_worker(edge_file: str) -> str:
+    process_edges(edge_file, _worker_node_type_map, **_worker_edge_options)
+    return edge_file
+
+def parse(data_files: List[str], edge_files: List[str], single_pass: bool = False,
+          workers: int = 1, extractor: str = 'regex',
+          max_edges_in_memory: Optional[int] = None, compact_node_table: bool = False,
+          output_format: str = 'jsonl', keep_timestamp: bool = False,
+          checkpoint_path: Optional[str] = None) -> None:
+    """Parse CDM18 node data and edges into one output per edge file
+
+    With checkpoint_path, parsing resumes from the byte offsets, node map and
+    dedup state saved by the previous run and only appends the edges of newly
+    written records; this mode reads sequentially and writes JSONL.
+    """
+    if extractor not in EDGE_EXTRACTORS:
+        raise ValueError(
+            f"Unknown edge extractor: {extractor}. Supported extractors: {', '.join(EDGE_EXTRACTORS)}"
+        )
+    if output_format not in OUTPUT_SUFFIXES:
+        raise ValueError(
+            f"Unknown output format: {output_format}. Supported formats: {', '.join(OUTPUT_SUFFIXES)}"
+        )
+
+    if checkpoint_path is not None:
+        if single_pass or workers > 1 or max_edges_in_memory or output_format != 'jsonl':
+            raise ValueError(
+                "Checkpointed parsing does not support single_pass, workers, max_edges_in_memory "
+                "or non-JSONL output formats"
+            )
+        _parse_incremental(data_files, edge_files, checkpoint_path, extractor,
+                           compact_node_table, keep_timestamp)
+        return
+
+    edge_options = {"extractor": extractor, "max_edges_in_memory": max_edges_in_memory,
+                    "output_format": output_format, "keep_timestamp": keep_timestamp}
+    if compact_node_table:
+        from .node_table import NodeTypeTable
+        node_type_map = NodeTypeTable()
+    else:
+        node_type_map: Dict[str, str] = {}
+    pending_edge_files = list(edge_files)
+    if single_pass:
+        process_single_pass(data_files, node_type_map, edge_files, extractor=extractor,
+                            output_format=output_format, keep_timestamp=keep_timestamp)
+        shard_paths = {os.path.abspath(path) for data_file in data_files for path in _shard_paths(data_file)}
+        pending_edge_files = [edge_file for edge_file in pending_edge_files
+                              if os.path.abspath(edge_file) not in shard_paths]
+        print(f"Processed node data: {len(node_type_map)} nodes")
+    else:
+        for data_file in data_files:
+            process_data(data_file, node_type_map, workers=workers)
+            print(f"Processed node data: {len(node_type_map)} nodes")
+
+    # Edge files outside the data file families still need a separate scan
+    if workers > 1 and len(pending_edge_files) > 1:
+        with Pool(processes=min(workers, len(pending_edge_files)),
+                  initializer=_init_edge_worker, initargs=(node_type_map, edge_options)) as pool:
+            for edge_file in pool.imap(_process_edges_worker, pending_edge_files):
+                print(f"Processed edges from: {edge_file}")
+        return
+
+    for edge_file in pending_edge_files:
+        print(f"Processing edges from: {edge_file}")
+        process_edges(edge_file, node_type_map, **edge_options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import os
+import json
+from array import array
+
+
+TIME_INDEX_SUFFIX = ".tsidx"
+TIME_INDEX_INTERVAL = 4096
+
+
+class JsonlEdgeWriter:
+    """Write edges in the unified JSONL schema, one record per line.
+
+    With keep_timestamp, records carry their nanosecond "timestamp" and a
+    sparse `<output>.tsidx` sidecar is written with one
+    "timestamp<TAB>byte offset<TAB>line number" entry every
+    TIME_INDEX_INTERVAL records, so readers of the timestamp-sorted output
+    can seek straight to a time window. With append, records are added to
+    an existing output that already holds line_count records. They are
+    sorted only among themselves, so the index entry of the first of them
+    gets a fourth "run" field, and readers treat every run separately.
+    """
+
+    def __init__(self, output_path, keep_timestamp=False, append=False, line_count=0):
+        self.output_path = output_path
+        self.keep_timestamp = keep_timestamp
+        mode = "a" if append else "w"
+        self.output_file = open(output_path, mode, encoding="utf-8")
+        self.index_file = None
+        if keep_timestamp:
+            self.index_file = open(output_path + TIME_INDEX_SUFFIX, mode, encoding="utf-8")
+        self.offset = self.output_file.tell()
+        self.line_count = line_count if append else 0
+        # Records appended after existing ones start a new sorted run
+        self.run_start = self.line_count > 0
+
+    def write(self, subject, event, obj, timestamp=None):
+        json_record = {"subject": subject, "event": event, "object": obj}
+        if self.keep_timestamp and timestamp is not None:
+            json_record["timestamp"] = timestamp
+            if self.run_start:
+                self.index_file.write(f"{timestamp}\t{self.offset}\t{self.line_count + 1}\trun\n")
+                self.run_start = False
+            elif self.line_count % TIME_INDEX_INTERVAL == 0:
+                self.index_file.write(f"{timestamp}\t{self.offset}\t{self.line_count + 1}\n")
+        line = json.dumps(json_record) + "\n"
+        self.output_file.write(line)
+        # json.dumps escapes non-ASCII characters, so characters are bytes
+        self.offset += len(line)
+        self.line_count += 1
+
+    def close(self):
+        self.output_file.close()
+        if self.index_file is not None:
+            self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ColumnarEdgeWriter:
+    """Write edges as NumPy column files in an output directory.
+
+    The directory holds `subject.npy` and `object.npy` (int64 ids into
+    `nodes.json`), `event.npy` (int16 codes into `events.json`) and, when
+    timestamps are given, `timestamp.npy` (int64 nanoseconds). Rows keep the
+    write order, so they stay chronological. Columns are buffered in compact
+    arrays and saved on close; `read_edge_columns` memory-maps them back.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.node_ids = {}
+        self.event_codes = {}
+        self.subjects = array("q")
+        self.objects = array("q")
+        self.events = array("h")
+        self.timestamps = array("q")
+
+    @staticmethod
+    def _intern(vocabulary, value):
+        code = vocabulary.get(value)
+        if code is None:
+            code = len(vocabulary)
+            vocabulary[value] = code
+        return code
+
+    def write(self, subject, event, obj, timestamp=None):
+        self.subjects.append(self._intern(self.node_ids, subject))
+        self.events.append(self._intern(self.event_codes, event))
+        self.objects.append(self._intern(self.node_ids, obj))
+        if timestamp is not None:
+            self.timestamps.append(timestamp)
+
+    def close(self):
+        import numpy as np
+
+        os.makedirs(self.output_path, exist_ok=True)
+        np.save(os.path.join(self.output_path, "subject.npy"), np.frombuffer(self.subjects, dtype=np.int64))
+        np.save(os.path.join(self.output_path, "object.npy"), np.frombuffer(self.objects, dtype=np.int64))
+        np.save(os.path.join(self.output_path, "event.npy"), np.frombuffer(self.events, dtype=np.int16))
+        if len(self.timestamps) == len(self.subjects) and len(self.timestamps):
+            np.save(os.path.join(self.output_path, "timestamp.npy"), np.frombuffer(self.timestamps, dtype=np.int64))
+        with open(os.path.join(self.output_path, "nodes.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.node_ids), f)
+        with open(os.path.join(self.output_path, "events.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.event_codes), f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+EDGE_WRITERS = {
+    "jsonl": JsonlEdgeWriter,
+    "npy": ColumnarEdgeWriter,
+}
+
+OUTPUT_SUFFIXES = {
+    "jsonl": ".jsonl",
+    "npy": ".columns",
+}
+
+
+def open_edge_writer(output_path, output_format="jsonl", keep_timestamp=False):
+    """Open an edge writer for the given output format.
+
+    Columnar outputs always store timestamps; keep_timestamp only affects JSONL.
+    """
+    if output_format not in EDGE_WRITERS:
+        raise ValueError(
+            f"Unknown output format: {output_format}. Supported formats: {', '.join(EDGE_WRITERS)}"
+        )
+    if output_format == "jsonl":
+        return JsonlEdgeWriter(output_path, keep_timestamp=keep_timestamp)
+    return EDGE_WRITERS[output_format](output_path)
@@ -1,5 +1,8 @@
+from array import array
 from collections import defaultdict
 
+import numpy as np
+
 
 def build_directed_graph(edges):
     """Build a directed graph from edges."""
@@ -10,11 +13,171 @@ def build_directed_graph(edges):
     return graph
 
 
-def build_undirected_graph(edges):
-    """Build an undirected graph from edges."""
+def build_undirected_graph(edges, ordered=False):
+    """Build an undirected graph from edges.
+
+    With ordered, the neighbors of a node are the keys of a dict, in order
+    of first appearance in edges, instead of a set, whose iteration order
+    depends on PYTHONHASHSEED. Seeded walks over an ordered graph are
+    therefore the same in every run.
+    """
+    if ordered:
+        graph = defaultdict(dict)
+        for edge in edges:
+            subject, obj = edge["subject"], edge["object"]
+            graph[subject][obj] = None
+            graph[obj][subject] = None
+        return graph
+
     graph = defaultdict(set)
     for edge in edges:
         subject, obj = edge["subject"], edge["object"]
         graph[subject].add(obj)
         graph[obj].add(subject)
     return graph
+
+
+class CSRNeighbors:
+    """Read-only view of the neighbors of one CSRGraph node, as string ids."""
+
+    def __init__(self, graph, indices):
+        self.graph = graph
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        node_ids = self.graph.node_ids
+        return (node_ids[index] for index in self.indices.tolist())
+
+    def __getitem__(self, position):
+        # Lets random.choice and random.sample index the CSR slice directly
+        return self.graph.node_ids[self.indices[position]]
+
+    def __contains__(self, node):
+        index = self.graph.node_index.get(node)
+        if index is None:
+            return False
+        position = np.searchsorted(self.indices, index)
+        return position < len(self.indices) and self.indices[position] == index
+
+
+class CSRGraph:
+    """Compressed sparse row graph over integer node ids.
+
+    Node ids are assigned in order of first appearance in the edge stream and
+    map back to strings through node_ids. The neighbors of node i are
+    indices[indptr[i]:indptr[i + 1]], sorted and without duplicates. The
+    graph also offers the read-only mapping API of the defaultdict(set)
+    graphs (graph[node], node in graph, iteration, keys(), items(), len()),
+    where only nodes with neighbors count as keys.
+
+    edge_keys, the sorted source * num_nodes + target keys of all edges
+    that has_edges() searches, come from from_edge_arrays() or may be
+    given precomputed, e.g. from shared memory; otherwise they are built
+    on first use.
+    """
+
+    def __init__(self, node_ids, indptr, indices, directed=False, edge_keys=None):
+        self.node_ids = node_ids
+        self.node_index = {node: index for index, node in enumerate(node_ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.directed = directed
+        self.degrees = np.diff(indptr)
+        self.edge_keys = edge_keys
+
+    @classmethod
+    def from_edges(cls, edges, directed=False):
+        """Build a graph from an iterable of edge dicts with "subject" and "object"."""
+        node_index = {}
+        subjects = array("q")
+        objects = array("q")
+        for edge in edges:
+            subjects.append(node_index.setdefault(edge["subject"], len(node_index)))
+            objects.append(node_index.setdefault(edge["object"], len(node_index)))
+        return cls.from_edge_arrays(
+            np.frombuffer(subjects, dtype=np.int64),
+            np.frombuffer(objects, dtype=np.int64),
+            list(node_index),
+            directed=directed,
+        )
+
+    @classmethod
+    def from_edge_arrays(cls, subjects, objects, node_ids, directed=False):
+        """Build a graph from integer subject/object arrays indexing into node_ids.
+
+        This takes the columns of the parsers' 'npy' output directly.
+        """
+        num_nodes = len(node_ids)
+        sources = np.asarray(subjects, dtype=np.int64)
+        targets = np.asarray(objects, dtype=np.int64)
+        if not directed:
+            sources, targets = (
+                np.concatenate([sources, targets]),
+                np.concatenate([targets, sources]),
+            )
+
+        # Sorting the combined keys orders edges by source, then target, and drops duplicates
+        keys = np.unique(sources * num_nodes + targets)
+        sources, targets = np.divmod(keys, num_nodes)
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return cls(node_ids, indptr, targets, directed=directed, edge_keys=keys)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def neighbor_indices(self, node_index):
+        return self.indices[self.indptr[node_index]:self.indptr[node_index + 1]]
+
+    def has_edges(self, sources, targets):
+        """Test which (source, target) integer id pairs are edges, vectorized.
+
+        Edges are looked up as source * num_nodes + target in edge_keys.
+        """
+        if self.edge_keys is None:
+            rows = np.repeat(np.arange(self.num_nodes, dtype=np.int64), self.degrees)
+            self.edge_keys = rows * self.num_nodes + self.indices
+        keys = np.asarray(sources, dtype=np.int64) * self.num_nodes + np.asarray(targets, dtype=np.int64)
+        if not len(self.edge_keys):
+            return np.zeros(keys.shape, dtype=bool)
+        positions = np.searchsorted(self.edge_keys, keys)
+        np.minimum(positions, len(self.edge_keys) - 1, out=positions)
+        return self.edge_keys[positions] == keys
+
+    def degree(self, node):
+        index = self.node_index.get(node)
+        if index is None:
+            return 0
+        return int(self.indptr[index + 1] - self.indptr[index])
+
+    def __getitem__(self, node):
+        # Unknown nodes have no neighbors, like a defaultdict(set) lookup
+        index = self.node_index.get(node)
+        if index is None:
+            return CSRNeighbors(self, self.indices[:0])
+        return CSRNeighbors(self, self.neighbor_indices(index))
+
+    def __contains__(self, node):
+        return self.degree(node) > 0
+
+    def __iter__(self):
+        node_ids = self.node_ids
+        return (node_ids[index] for index in np.flatnonzero(self.degrees).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.degrees))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((node, self[node]) for node in self)
@@ -0,0 +1,243 @@
+import numpy as np
+
+
+LOW_MASK = (1 << 64) - 1
+
+# Character positions of the dashes and hex digits of a UUID string
+DASH_COLUMNS = [8, 13, 18, 23]
+HEX_COLUMNS = [column for column in range(36) if column not in DASH_COLUMNS]
+NIBBLE_SHIFTS = np.arange(60, -1, -4, dtype=np.uint64)
+
+# Value of every ASCII hex digit, 255 for any other character
+HEX_VALUES = np.full(128, 255, dtype=np.uint8)
+for _value, _digit in enumerate("0123456789abcdef"):
+    HEX_VALUES[ord(_digit)] = HEX_VALUES[ord(_digit.upper())] = _value
+
+
+def _uuid_int(node_id):
+    """Convert a UUID string into a 128-bit integer, or None if it is not a UUID."""
+    if (len(node_id) != 36 or node_id[8] != "-" or node_id[13] != "-"
+            or node_id[18] != "-" or node_id[23] != "-"):
+        return None
+    digits = node_id.replace("-", "")
+    # int() also accepts signs, underscores and non-ASCII digits, which this rules out
+    if not (digits.isascii() and digits.isalnum()):
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def _uuid_arrays(node_ids):
+    """Convert a list of id strings into (high, low, is_uuid) arrays, vectorized.
+
+    Accepts the same UUIDs as _uuid_int; high and low are meaningless where
+    is_uuid is False.
+    """
+    # A 37th column is non-zero only for strings longer than a UUID
+    chars = np.array(node_ids, dtype="U37").view(np.uint32).reshape(len(node_ids), 37)
+    digits = chars[:, HEX_COLUMNS]
+    nibbles = HEX_VALUES[np.minimum(digits, 127)]
+    is_uuid = (
+        (chars[:, 36] == 0)
+        & np.all(chars[:, DASH_COLUMNS] == ord("-"), axis=1)
+        & np.all((digits < 128) & (nibbles != 255), axis=1)
+    )
+    nibbles = nibbles.astype(np.uint64)
+    high = np.bitwise_or.reduce(nibbles[:, :16] << NIBBLE_SHIFTS, axis=1)
+    low = np.bitwise_or.reduce(nibbles[:, 16:] << NIBBLE_SHIFTS, axis=1)
+    return high, low, is_uuid
+
+
+class NodeTypeTable:
+    """Compact drop-in replacement for the id -> node type dict of the parsers.
+
+    UUIDs are stored as 128-bit integers split over two sorted uint64 arrays,
+    and node types as uint16 codes into an interned type vocabulary, which
+    takes 18 bytes per node instead of a str -> str dict entry. New entries
+    are buffered in a small dict and merged into the sorted arrays once
+    buffer_size entries have accumulated, by sorting only the new entries and
+    inserting them into place; later assignments win as in a dict.
+    UUIDs are compared case-insensitively; ids that are not UUIDs are kept
+    in a plain dict.
+
+    Every `in` or [] lookup parses one UUID and searches the arrays on its
+    own, which costs several microseconds; known() looks up a whole chunk of
+    ids at once with vectorized NumPy operations instead.
+    """
+
+    def __init__(self, buffer_size=1000000):
+        self.buffer_size = buffer_size
+        self.type_names = []
+        self.type_codes = {}
+        self.high = np.empty(0, dtype=np.uint64)
+        self.low = np.empty(0, dtype=np.uint64)
+        self.codes = np.empty(0, dtype=np.uint16)
+        self.pending = {}  # uuid int -> type code, not merged yet
+        self.other_ids = {}  # non-UUID id -> type code
+
+    def _type_code(self, node_type):
+        code = self.type_codes.get(node_type)
+        if code is None:
+            code = len(self.type_names)
+            self.type_codes[node_type] = code
+            self.type_names.append(node_type)
+        return code
+
+    def _find(self, key):
+        """Return the array position of a UUID integer, or -1 if it is absent."""
+        high = key >> 64
+        low = key & LOW_MASK
+        position = int(np.searchsorted(self.high, np.uint64(high)))
+        # Random UUIDs rarely share their high half, so this loop is short
+        while position < len(self.high) and int(self.high[position]) == high:
+            if int(self.low[position]) == low:
+                return position
+            position += 1
+        return -1
+
+    def _code(self, node_id):
+        key = _uuid_int(node_id)
+        if key is None:
+            return self.other_ids.get(node_id)
+        code = self.pending.get(key)
+        if code is not None:
+            return code
+        position = self._find(key)
+        return None if position == -1 else int(self.codes[position])
+
+    def _find_many(self, high, low):
+        """Vectorized _find: the array positions of UUID halves, -1 where absent."""
+        # Sorted queries walk the arrays in order, which avoids most cache misses
+        order = np.argsort(high)
+        high = high[order]
+        low = low[order]
+        starts = np.searchsorted(self.high, high, side="left")
+        ends = np.searchsorted(self.high, high, side="right")
+        found = np.full(len(high), -1, dtype=np.int64)
+        single = np.flatnonzero(ends - starts == 1)
+        hits = single[self.low[starts[single]] == low[single]]
+        found[hits] = starts[hits]
+        # Random UUIDs rarely share their high half, so this loop is short
+        for i in np.flatnonzero(ends - starts > 1):
+            start, end = starts[i], ends[i]
+            position = start + np.searchsorted(self.low[start:end], low[i])
+            if position < end and self.low[position] == low[i]:
+                found[i] = position
+
+        positions = np.empty_like(found)
+        positions[order] = found
+        return positions
+
+    def _positions(self, high, low):
+        """Return the insertion positions of sorted (high, low) keys in the sorted arrays."""
+        positions = np.searchsorted(self.high, high, side="left")
+        ends = np.searchsorted(self.high, high, side="right")
+        # Keys whose high half is already present are placed by their low half
+        for i in np.flatnonzero(ends > positions):
+            start, end = positions[i], ends[i]
+            positions[i] = start + np.searchsorted(self.low[start:end], low[i])
+        return positions
+
+    def _merge(self, high, low, codes):
+        """Merge sorted, unique UUID arrays into the sorted arrays, letting the new entries win.
+
+        Only the new entries are searched for; the existing arrays are copied
+        once by np.insert instead of being sorted again.
+        """
+        positions = self._positions(high, low)
+        in_bounds = positions < len(self.high)
+        existing = np.zeros(len(high), dtype=bool)
+        existing[in_bounds] = (self.high[positions[in_bounds]] == high[in_bounds]) & (
+            self.low[positions[in_bounds]] == low[in_bounds]
+        )
+        self.codes[positions[existing]] = codes[existing]
+
+        new = ~existing
+        self.high = np.insert(self.high, positions[new], high[new])
+        self.low = np.insert(self.low, positions[new], low[new])
+        self.codes = np.insert(self.codes, positions[new], codes[new])
+
+    def compact(self):
+        """Merge buffered entries into the sorted arrays."""
+        if not self.pending:
+            return
+        keys = list(self.pending)
+        high = np.fromiter((key >> 64 for key in keys), dtype=np.uint64, count=len(keys))
+        low = np.fromiter((key & LOW_MASK for key in keys), dtype=np.uint64, count=len(keys))
+        codes = np.fromiter(self.pending.values(), dtype=np.uint16, count=len(keys))
+        # pending is a dict, so its keys are unique; only the batch is sorted
+        order = np.lexsort((low, high))
+        self._merge(high[order], low[order], codes[order])
+        self.pending = {}
+
+    def __setitem__(self, node_id, node_type):
+        code = self._type_code(node_type)
+        key = _uuid_int(node_id)
+        if key is None:
+            self.other_ids[node_id] = code
+            return
+        self.pending[key] = code
+        if len(self.pending) >= self.buffer_size:
+            self.compact()
+
+    def __getitem__(self, node_id):
+        code = self._code(node_id)
+        if code is None:
+            raise KeyError(node_id)
+        return self.type_names[code]
+
+    def __contains__(self, node_id):
+        return self._code(node_id) is not None
+
+    def known(self, node_ids):
+        """Return the set of the given ids that are in the table.
+
+        The UUIDs are parsed and searched in the sorted arrays in one
+        vectorized pass, so checking the ids of a chunk of events this way
+        is much faster than one `in` test per id. Buffered entries are
+        checked without merging them.
+        """
+        node_ids = list(node_ids)
+        high, low, is_uuid = _uuid_arrays(node_ids)
+        found = is_uuid & (self._find_many(high, low) != -1)
+        known = {node_ids[i] for i in np.flatnonzero(found).tolist()}
+
+        if self.pending:
+            for i in np.flatnonzero(is_uuid & ~found).tolist():
+                if (int(high[i]) << 64 | int(low[i])) in self.pending:
+                    known.add(node_ids[i])
+        for i in np.flatnonzero(~is_uuid).tolist():
+            if node_ids[i] in self.other_ids:
+                known.add(node_ids[i])
+        return known
+
+    def get(self, node_id, default=None):
+        code = self._code(node_id)
+        return default if code is None else self.type_names[code]
+
+    def __len__(self):
+        self.compact()
+        return len(self.codes) + len(self.other_ids)
+
+    def update(self, other):
+        """Merge a dict or another NodeTypeTable, letting its entries win."""
+        if not isinstance(other, NodeTypeTable):
+            for node_id, node_type in other.items():
+                self[node_id] = node_type
+            return
+
+        self.compact()
+        other.compact()
+        recode = np.array(
+            [self._type_code(name) for name in other.type_names], dtype=np.uint16
+        )
+        if len(other.codes):
+            self._merge(other.high, other.low, recode[other.codes])
+        for node_id, code in other.other_ids.items():
+            self.other_ids[node_id] = recode[code].item()
+
+    def nbytes(self):
+        """Approximate memory used by the UUID arrays."""
+        return self.high.nbytes + self.low.nbytes + self.codes.nbytes
@@ -1,41 +1,240 @@
+import os
+import io
+import gzip
 import json
+import shutil
+import subprocess
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import Pool
 
+from .dedup import make_edge_filter
+from .edge_writer import open_edge_writer, JsonlEdgeWriter
+from .checkpoint import ParseCheckpoint
 
-def transform_line(line, processed):
-    try:
-        data = json.loads(line.strip())
 
-        actor_id = data.get("actorID", "")
-        action = data.get("action", "")
-        object_id = data.get("objectID", "")
+CHUNK_SIZE = 64 * 1024 * 1024
+LINE_BATCH_SIZE = 20000
 
-        new_data = {"subject": actor_id, "event": action, "object": object_id}
+# Same host filter as download_extract_optc.extract_logs_from_archive
+HOST_PATTERN = "../SysClient{host_id}"
 
-        if (actor_id, action, object_id) in processed:
-            return None
-        processed.add((actor_id, action, object_id))
-
-        return json.dumps(new_data)
 
+def _transform_record(line):
+    """Decode an ECAR record into its (actor, action, object) edge key"""
+    try:
+        data = json.loads(line.strip())
     except json.JSONDecodeError:
         print(f"Failed to parse JSON line: {line}")
         return None
 
+    actor_id = data.get("actorID", "")
+    action = data.get("action", "")
+    object_id = data.get("objectID", "")
+    return actor_id, action, object_id
+
+
+def transform_line(line, processed):
+    edge_key = _transform_record(line)
+    if edge_key is None:
+        return None
+
+    if edge_key in processed:
+        return None
+    processed.add(edge_key)
+
+    actor_id, action, object_id = edge_key
+    new_data = {"subject": actor_id, "event": action, "object": object_id}
+    return json.dumps(new_data)
+
+
+def _chunk_boundaries(input_file, chunk_size):
+    """Split a file into [start, end) byte ranges aligned to line starts"""
+    file_size = os.path.getsize(input_file)
+    boundaries = [0]
+    with open(input_file, "rb") as f:
+        while boundaries[-1] < file_size:
+            f.seek(boundaries[-1] + chunk_size)
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _transform_chunk(args):
+    """Decode the records of one byte range (worker entry point)"""
+    input_file, start, end = args
+    edge_keys = []
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            edge_key = _transform_record(line.decode("utf-8"))
+            if edge_key is not None:
+                edge_keys.append(edge_key)
+    return edge_keys
+
+
+def _transform_lines(lines):
+    """Decode a batch of records (worker entry point)"""
+    edge_keys = []
+    for line in lines:
+        edge_key = _transform_record(line)
+        if edge_key is not None:
+            edge_keys.append(edge_key)
+    return edge_keys
+
+
+@contextmanager
+def _open_lines(input_file):
+    """Open a plain or gzip-compressed ECAR file as an iterator of text lines
+
+    Archives are decompressed by pigz in a separate process when it is
+    installed, and by the gzip module otherwise; either way a corrupt or
+    truncated archive raises once its end is reached.
+    """
+    if not input_file.endswith(".gz"):
+        with open(input_file, "r", encoding="utf-8") as infile:
+            yield infile
+        return
+
+    pigz = shutil.which("pigz")
+    if pigz is None:
+        with gzip.open(input_file, "rt", encoding="utf-8") as infile:
+            yield infile
+        return
+
+    command = [pigz, "-dc", input_file]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    completed = False
+    try:
+        yield io.TextIOWrapper(process.stdout, encoding="utf-8")
+        # Output left in the pipe means the caller stopped reading early
+        completed = not process.stdout.read(1)
+    finally:
+        if not completed:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+    # A corrupt or truncated archive must not pass for a short one
+    if completed and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def _filter_host(lines, host_id):
+    if host_id is None:
+        yield from lines
+        return
+    host_pattern = HOST_PATTERN.format(host_id=host_id)
+    for line in lines:
+        if host_pattern in line:
+            yield line
+
+
+def _iter_lines(input_file, host_id, checkpoint=None):
+    if checkpoint is not None:
+        yield from _filter_host(checkpoint.iter_new_lines(input_file), host_id)
+        return
+    with _open_lines(input_file) as lines:
+        yield from _filter_host(lines, host_id)
+
+
+def _iter_line_batches(input_file, host_id, checkpoint=None):
+    batch = []
+    for line in _iter_lines(input_file, host_id, checkpoint):
+        batch.append(line)
+        if len(batch) >= LINE_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_edge_keys(input_file, workers, chunk_size, host_id=None, checkpoint=None):
+    """Yield the edge keys of a file in order, decoding chunks in parallel
+
+    Plain files are split into byte ranges that workers read themselves;
+    compressed, host-filtered or checkpointed inputs are streamed here and
+    sent to the workers in batches of lines.
+    """
+    if workers <= 1:
+        for line in _iter_lines(input_file, host_id, checkpoint):
+            edge_key = _transform_record(line)
+            if edge_key is not None:
+                yield edge_key
+        return
+
+    if input_file.endswith(".gz") or host_id is not None or checkpoint is not None:
+        tasks = _iter_line_batches(input_file, host_id, checkpoint)
+        transform = _transform_lines
+    else:
+        tasks = iter([(input_file, start, end) for start, end in _chunk_boundaries(input_file, chunk_size)])
+        transform = _transform_chunk
+
+    with Pool(processes=workers) as pool:
+        # Keep a few tasks per worker in flight, so reading the next chunk here
+        # overlaps with decoding while pending results stay bounded
+        max_pending = workers * 2
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(transform, (task,)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def process_file(input_file, output_file, output_format="jsonl", workers=1, dedup="exact",
+                 dedup_capacity=None, chunk_size=CHUNK_SIZE, host_id=None, checkpoint_path=None):
+    """Transform ECAR records into unified edges, dropping repeated edges
+
+    input_file may be a single path or a list of paths, each either a host
+    log or a `.json.gz` archive that is decompressed on the fly; with host_id
+    only the records of that host are kept. With workers > 1 records are
+    decoded in worker processes and merged back in file order. dedup selects
+    the filter for repeated edges: 'exact' keeps string tuples, 'hash' keeps
+    64-bit hashes and 'bloom' checks a Bloom filter sized for
+    dedup_capacity distinct edges before the 64-bit hashes, which it keeps
+    in sorted arrays to use less memory than 'hash'.
 
-def process_file(input_file, output_file):
-    processed = set()
-    with open(input_file, "r", encoding="utf-8") as infile, open(
-        output_file, "w", encoding="utf-8"
-    ) as outfile:
+    With checkpoint_path, only records appended to plain input files since
+    the previous run are parsed and their edges are appended to the JSONL
+    output, deduplicated against the saved filter.
+    """
+    input_files = [input_file] if isinstance(input_file, str) else input_file
+    if checkpoint_path is None:
+        edge_filter = make_edge_filter(dedup, dedup_capacity)
+        with open_edge_writer(output_file, output_format) as writer:
+            for current_file in input_files:
+                for edge_key in _iter_edge_keys(current_file, workers, chunk_size, host_id):
+                    if edge_filter.add_if_new(*edge_key):
+                        writer.write(*edge_key)
+        return
 
-        for line in infile:
-            transformed_line = transform_line(line, processed)
-            if transformed_line:
-                outfile.write(transformed_line + "\n")
+    if output_format != "jsonl" or any(path.endswith(".gz") for path in input_files):
+        raise ValueError("Checkpointed parsing needs plain input files and JSONL output")
+    checkpoint = ParseCheckpoint(checkpoint_path)
+    edge_filter = checkpoint.state.get("edge_filter")
+    if edge_filter is None:
+        edge_filter = make_edge_filter(dedup, dedup_capacity)
+        checkpoint.state["edge_filter"] = edge_filter
+    line_count = checkpoint.restore_output(output_file)
+    with JsonlEdgeWriter(output_file, append=True, line_count=line_count) as writer:
+        for current_file in input_files:
+            for edge_key in _iter_edge_keys(current_file, workers, chunk_size, host_id, checkpoint):
+                if edge_filter.add_if_new(*edge_key):
+                    writer.write(*edge_key)
+    checkpoint.record_output(output_file, writer.line_count)
+    checkpoint.save()
 
 
-def parse(input_filename, output_filename):
-    process_file(input_filename, output_filename)
+def parse(input_filename, output_filename, output_format="jsonl", workers=1, dedup="exact",
+          dedup_capacity=None, host_id=None, checkpoint_path=None):
+    process_file(input_filename, output_filename, output_format, workers=workers, dedup=dedup,
+                 dedup_capacity=dedup_capacity, host_id=host_id, checkpoint_path=checkpoint_path)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,17 @@
 from prompter import *
+import os
 import requests
 import json
+import time
+import random
+import asyncio
+import threading
+
+
+# Sessions keep connections to the LLM server alive across queries, one per thread
+_thread_local = threading.local()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 
 def _plugin1_prompting(natural_language_text):
@@ -19,20 +30,36 @@ def _plugin2_prompting(natural_language_text):
     return query
 
 
-def _query_llm(query):
-    payload = {
-        "model": MODEL,
+def _chat_payload(query, model, max_tokens, temperature, top_p):
+    return {
+        "model": model,
         "messages": [{"role": "user", "content": query}],
-        "max_tokens": MAX_TOKENS,
-        "temperature": TEMPERATURE,
-        "top_p": TOP_P,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": top_p,
         "top_k": 20,
     }
+
+
+def _session():
+    # A forked worker must not share the pooled connections of its parent
+    if getattr(_thread_local, "pid", None) != os.getpid():
+        _thread_local.session = requests.Session()
+        _thread_local.pid = os.getpid()
+    return _thread_local.session
+
+
+def _query_llm(query, cache=None):
+    payload = _chat_payload(query, MODEL, MAX_TOKENS, TEMPERATURE, TOP_P)
+    if cache is not None:
+        response = cache.get(payload)
+        if response is not None:
+            return response
     headers = {
         "Authorization": "Bearer YOUR_API_KEY"  # Do not need to change for local vLLM
     }
     try:
-        r = requests.post(
+        r = _session().post(
             f"{API_URL}/chat/completions", json=payload, headers=headers, timeout=600
         )
         if r.status_code != 200:
@@ -40,20 +67,190 @@ def _query_llm(query):
         data = r.json()
         if "choices" not in data:
             raise KeyError(f"Response missing 'choices': {json.dumps(data)[:300]}")
-        return data["choices"][0]["message"]["content"]
+        response = data["choices"][0]["message"]["content"]
     except Exception as e:
         return f"[API call failed] {e}"
 
+    # Failed calls are not cached, so they are retried on the next run
+    if cache is not None:
+        cache.put(payload, response)
+    return response
 
-def query_llm_using_plugin(natural_language_text, plugin_name="Plugin1"):
+
+def _plugin_prompting(natural_language_text, plugin_name):
     if plugin_name == "Plugin1":
-        query = _plugin1_prompting(natural_language_text)
-    else:
-        query = _plugin2_prompting(natural_language_text)
-    response = _query_llm(query)
+        return _plugin1_prompting(natural_language_text)
+    return _plugin2_prompting(natural_language_text)
+
+
+def query_llm_using_plugin(natural_language_text, plugin_name="Plugin1", cache=None):
+    """Query the LLM with the plugin prompt, answering from a ResponseCache if one is given."""
+    query = _plugin_prompting(natural_language_text, plugin_name)
+    response = _query_llm(query, cache)
     return response
 
 
+class AsyncLLMClient:
+    """Asyncio client for an OpenAI-compatible chat completions server.
+
+    Keeps one aiohttp session with a pool of up to max_concurrency
+    connections to {api_url}/chat/completions, and at most max_concurrency
+    requests in flight. Requests that fail with a 429 or 5xx status or a
+    connection error are retried up to max_retries times after an
+    exponential backoff of backoff * 2 ** attempt seconds (plus jitter, or
+    the server's Retry-After). The latency of every successful request is
+    recorded for latency_stats(). Like query_llm_using_plugin, queries that
+    fail for good return an "[API call failed] ..." string, and with a
+    ResponseCache as cache, answered queries are not sent again.
+
+    Use it as an async context manager:
+
+        async with AsyncLLMClient(API_URL, MODEL) as client:
+            responses = await client.query_many(texts, "Plugin1")
+    """
+
+    def __init__(self, api_url, model, max_tokens=32768, temperature=0.8, top_p=0.95,
+                 max_concurrency=32, max_retries=5, backoff=1.0, timeout=600,
+                 api_key="YOUR_API_KEY", cache=None):
+        self.url = f"{api_url.rstrip('/')}/chat/completions"
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.session = None
+        self.semaphore = None
+        self.latencies = []
+        self.retries = 0
+        self.failures = 0
+        self.cache = cache
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** attempt * (1 + random.random() / 2)
+
+    async def _post(self, payload):
+        """POST one request, returning (status, retry_after, body text)."""
+        async with self.session.post(self.url, json=payload) as r:
+            return r.status, r.headers.get("Retry-After"), await r.text()
+
+    async def query(self, query):
+        import aiohttp
+
+        payload = _chat_payload(query, self.model, self.max_tokens, self.temperature, self.top_p)
+        if self.cache is not None:
+            response = self.cache.get(payload)
+            if response is not None:
+                return response
+
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                retry_after = None
+                retryable = True
+                try:
+                    status, retry_after, text = await self._post(payload)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                else:
+                    if status == 200:
+                        self.latencies.append(time.perf_counter() - start)
+                        break
+                    error = RuntimeError(f"HTTP {status}: {text[:300]}")
+                    retryable = status in RETRY_STATUS_CODES
+
+                if not retryable or attempt == self.max_retries:
+                    self.failures += 1
+                    return f"[API call failed] {error}"
+                self.retries += 1
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+        try:
+            data = json.loads(text)
+            if "choices" not in data:
+                raise KeyError(f"Response missing 'choices': {json.dumps(data)[:300]}")
+            response = data["choices"][0]["message"]["content"]
+        except Exception as e:
+            self.failures += 1
+            return f"[API call failed] {e}"
+
+        if self.cache is not None:
+            self.cache.put(payload, response)
+        return response
+
+    async def query_using_plugin(self, natural_language_text, plugin_name="Plugin1"):
+        return await self.query(_plugin_prompting(natural_language_text, plugin_name))
+
+    async def query_many(self, natural_language_texts, plugin_name="Plugin1"):
+        """Query all texts concurrently, returning the responses in input order."""
+        return await asyncio.gather(
+            *(self.query_using_plugin(text, plugin_name) for text in natural_language_texts)
+        )
+
+    def latency_stats(self):
+        """Count, mean, median, 95th percentile and max latency of successful requests, in seconds."""
+        if not self.latencies:
+            return {"count": 0, "retries": self.retries, "failures": self.failures}
+        latencies = sorted(self.latencies)
+        return {
+            "count": len(latencies),
+            "mean": sum(latencies) / len(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            "max": latencies[-1],
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+def query_llm_using_plugin_async(natural_language_texts, plugin_name="Plugin1", **client_options):
+    """Query many texts with an AsyncLLMClient from synchronous code.
+
+    client_options default to the module's API_URL, MODEL and sampling
+    parameters. Returns the responses in input order and the latency stats.
+    """
+    defaults = {
+        "api_url": "API_URL",
+        "model": "MODEL",
+        "max_tokens": "MAX_TOKENS",
+        "temperature": "TEMPERATURE",
+        "top_p": "TOP_P",
+    }
+    for option, name in defaults.items():
+        if option not in client_options:
+            client_options[option] = globals()[name]
+
+    async def run():
+        async with AsyncLLMClient(**client_options) as client:
+            responses = await client.query_many(natural_language_texts, plugin_name)
+            return responses, client.latency_stats()
+
+    return asyncio.run(run())
+
+
 if __name__ == "__main__":
     # Example input activity corpus
     input_activity_corpus = "REPLACE_WITH_ACTIVITY_CORPUS"
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+def response_cache_key(payload):
+    """Hash a chat completions payload (model, prompt and sampling parameters)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of LLM responses in a SQLite database.
+
+    Responses are keyed by the SHA-256 of the whole request payload, so the
+    same prompt (plugin prompt and activity corpus) sent to the same model
+    with the same sampling parameters is answered from disk, e.g. when an
+    experiment is re-run with the same seed after a crash. Once the stored
+    responses exceed max_bytes, the least recently used ones are evicted.
+    Hit, miss and eviction counters are kept in the database, so they add
+    up over all worker processes and runs, see stats().
+
+    Lookups are plain reads, so concurrent readers never wait for each
+    other. Their hit/miss counts and last-use times are collected in memory
+    and written with the next put(), every flush_interval lookups or
+    seconds, and on flush() or close(). Pool workers are terminated without
+    flushing, so a worker hands its pending lookups to the parent with
+    take_pending(), which adds them with merge_pending(), as
+    multi_round_workflow does after every task.
+
+    Connections are opened lazily, one per process and thread, so a cache
+    can be passed to worker processes and used from several threads.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30, timeout=60, flush_interval=100):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._reset_pending()
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            connection.executemany(
+                "INSERT OR IGNORE INTO counters VALUES (?, 0)",
+                [("hits",), ("misses",), ("evictions",), ("bytes",)],
+            )
+
+    def __getstate__(self):
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "timeout": self.timeout,
+            "flush_interval": self.flush_interval,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._lock = threading.Lock()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_used = {}  # key -> last use time, not written yet
+        self._last_flush = time.monotonic()
+
+    def _connection(self):
+        # A forked worker must not reuse the connection of its parent
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        # Take the write lock up front, so concurrent writers wait for each
+        # other instead of failing to upgrade a read lock
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _increment(connection, name, value=1):
+        connection.execute("UPDATE counters SET value = value + ? WHERE name = ?", (value, name))
+
+    def get(self, payload):
+        """Return the cached response of a payload, or None."""
+        key = response_cache_key(payload)
+        row = self._connection().execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self._pending_misses += 1
+            else:
+                self._pending_hits += 1
+                self._pending_used[key] = time.time()
+            due = self._flush_due()
+        if due:
+            self.flush()
+        return None if row is None else row[0]
+
+    def _flush_due(self):
+        lookups = self._pending_hits + self._pending_misses
+        return lookups >= self.flush_interval or time.monotonic() - self._last_flush >= self.flush_interval
+
+    def take_pending(self):
+        """Return and clear the (hits, misses, last uses) of the lookups not written yet."""
+        with self._lock:
+            pending = (self._pending_hits, self._pending_misses, self._pending_used)
+            self._pending_hits = 0
+            self._pending_misses = 0
+            self._pending_used = {}
+            self._last_flush = time.monotonic()
+        return pending
+
+    def _write_pending(self, connection, pending):
+        hits, misses, used = pending
+        if hits:
+            self._increment(connection, "hits", hits)
+        if misses:
+            self._increment(connection, "misses", misses)
+        if used:
+            connection.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in used.items()],
+            )
+
+    def merge_pending(self, pending):
+        """Add lookups taken with take_pending() from the cache of another process."""
+        hits, misses, used = pending
+        with self._lock:
+            self._pending_hits += hits
+            self._pending_misses += misses
+            for key, last_used in used.items():
+                if last_used > self._pending_used.get(key, 0):
+                    self._pending_used[key] = last_used
+            due = self._flush_due()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the counts and last-use times of the lookups so far."""
+        pending = self.take_pending()
+        if any(pending):
+            with self._transaction() as connection:
+                self._write_pending(connection, pending)
+
+    def put(self, payload, response):
+        key = response_cache_key(payload)
+        size = len(response.encode("utf-8"))
+        pending = self.take_pending()
+        with self._transaction() as connection:
+            self._write_pending(connection, pending)
+            row = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, size, time.time())
+            )
+            self._increment(connection, "bytes", size - (row[0] if row else 0))
+            self._evict(connection)
+
+    def _evict(self, connection):
+        """Delete the least recently used responses until max_bytes is respected."""
+        total = connection.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0]
+        evicted = 0
+        while total > self.max_bytes:
+            rows = connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        if evicted:
+            self._increment(connection, "evictions", evicted)
+            connection.execute("UPDATE counters SET value = ? WHERE name = 'bytes'", (total,))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        self.flush()
+        counters = dict(self._connection().execute("SELECT name, value FROM counters"))
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "entries": len(self),
+            "bytes": counters["bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "evictions": counters["evictions"],
+        }
+
+    def close(self):
+        self.flush()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local = threading.local()
+